@@ -28,7 +28,7 @@ sudo('apt-get', 'update')
 sudo('apt-get', 'upgrade')
 
 packs = ['python-pip', 'python-graph-tool', 'rethinkdb']
-pips = ['cython', 'simplejson', 'CherryPy', 'rethinkdb', 'futures', 'dill', 'cloud']
+pips = ['cython', 'simplejson', 'CherryPy', 'rethinkdb', 'futures', 'dill', 'cloud', 'msgpack']
 
 sudo(*apt_install+packs)
 
@@ -22,6 +22,13 @@ var streamify = require('stream-generators');
 var csv = require('fast-csv');
 var stream = require('stream');
 var util = require('util');
+var msgpack;
+try{
+    msgpack = require('msgpack-lite');
+}
+catch(e){
+    msgpack = null;
+}
 
 module.exports = function(){
     String.prototype.format = function () {
@@ -51,8 +58,27 @@ module.exports = function(){
         this.key = options.key;
         this.verify = options.verify;
         this.delim = "\t";
+        this.wireFormat = options.wireFormat || "json";
         this.update = me.host+"preql/update";
 
+        function frame(item){
+            let packed = msgpack.encode(item);
+            let head = Buffer.alloc(4);
+            head.writeUInt32BE(packed.length, 0);
+            return Buffer.concat([head, packed]);
+        }
+
+        function stream_frames (iterable, verbose){
+            return function*(){
+                for(let item of iterable){
+                    if(verbose){
+                        console.log(item);
+                    }
+                    yield frame(item);
+                }
+            };
+        }
+
         function stream_json (iterable, verbose){
             return function*(){
                 verbose = verbose || false;
@@ -136,8 +162,27 @@ module.exports = function(){
         function ResponseStream(callback, finished, input){
             stream.Writable.call(this);
             var buffer = '';
+            var frames = Buffer.alloc(0);
+            var binary = false;
             var stop = input.close;
+            input.on('response', function(resp){
+                binary = resp.headers['content-type'] === 'application/x-msgpack';
+            });
             this._write = function(chunk, encoding, next){
+                if(binary){
+                    frames = Buffer.concat([frames, chunk]);
+                    let offset = 0;
+                    while(frames.length - offset >= 4){
+                        let size = frames.readUInt32BE(offset);
+                        if(frames.length - offset - 4 < size){
+                            break;
+                        }
+                        callback(msgpack.decode(frames.slice(offset + 4, offset + 4 + size)), stop);
+                        offset += 4 + size;
+                    }
+                    frames = frames.slice(offset);
+                    return next();
+                }
                 buffer += chunk;
                 let i;
                 let piece = '';
@@ -163,17 +208,23 @@ module.exports = function(){
             var headers = {
                 'Api-Key': me.key,
                 'g': query.g,
-                'q': q
+                'q': q,
+                'Wire-Format': me.wireFormat
             };
             if(q === "insert"){
                 headers.params = JSON.stringify(query.params);
-                post_catch(me.api, stream_json(query.body, verbose), headers, callback, true);
+                if(me.wireFormat === "msgpack"){
+                    post_catch(me.api, stream_frames(query.body, verbose), headers, callback, true);
+                }
+                else{
+                    post_catch(me.api, stream_json(query.body, verbose), headers, callback, true);
+                }
             }
             else if(["create_graph", "drop_graph", "list_graphs", "graph_stats"].indexOf(q) > -1){
                 post_catch(me.api, null, headers, callback);
             }
             else if(["pluck", "stream", "update", "topology", "generate", "commit", "graph_filter", "delete",
-                   "create_index", "walk", "fields"].indexOf(q) > -1){
+                   "create_index", "walk", "fields", "cache_fields"].indexOf(q) > -1){
                 headers.params = JSON.stringify(query.params);
                 put_catch(me.api, JSON.stringify(query.body), headers, callback, finished, query.stream);
             }
@@ -203,26 +254,38 @@ module.exports = function(){
         if(host.substr(host.length-1) !== "/"){
             host += "/";
         }
+        var ping = function(key){
+            var opts = {
+                'url': host+'preql/q',
+                'headers': {
+                    'q': 'ping'
+                },
+                'strictSSL': verify
+            };
+            if(key){
+                opts.headers['Api-Key'] = key;
+            }
+            request(opts, function(err, resp, body){
+                if(body === "Hi there!"){
+                    let serverFormats = (resp.headers['wire-formats'] || 'json').split(',').map(function(f){
+                        return f.trim();
+                    });
+                    let wireFormat = msgpack && serverFormats.indexOf('msgpack') > -1 ? 'msgpack' : 'json';
+                    callback(new Connection({host: host, key: key, verify: verify, wireFormat: wireFormat}))
+                }
+            })
+        };
         if(options.key_file) {
             fs.readFile(options.key_file, 'utf8', function (err, data) {
                 if (err) {
                     return console.log(err);
                 }
-                var opts = {
-                    'url': host+'preql/q',
-                    'headers': {
-                        'Api-Key': data,
-                        'q': 'ping'
-                    },
-                    'strictSSL': verify
-                };
-                request(opts, function(err, resp, body){
-                    if(body === "Hi there!"){
-                        callback(new Connection({host: host, key: data, verify: verify}))
-                    }
-                })
+                ping(data);
             })
         }
+        else{
+            ping(null);
+        }
     }
 
     function Runnable(){
@@ -639,6 +702,20 @@ module.exports = function(){
             return nq
         };
 
+        this.skip = function(number){
+            var nq = this._clone();
+            nq.body.skip = number;
+            nq.queryString += ".skip({})".format(number);
+            return nq
+        };
+
+        this.valueRange = function(options){
+            var nq = this._clone();
+            nq.body.value_range = {'min': options.min, 'max': options.max};
+            nq.queryString += ".valueRange({})".format(JSON.stringify(options));
+            return nq
+        };
+
         this.map = function(mapper){
             var nq = this._clone();
             nq.body.js_func = true;
@@ -688,6 +765,16 @@ module.exports = function(){
             return nq
         };
 
+        this.cacheFields = function(fields, drop){
+            var nq = this._clone();
+            nq.q = "cache_fields";
+            nq.stream = false;
+            nq.body.fields = fields;
+            nq.body.drop = !!drop;
+            nq.queryString += ".cacheFields({})".format(JSON.stringify(fields));
+            return nq;
+        };
+
         this.count = function(){
             var nq = this._clone();
             nq.body.count = true;
@@ -741,12 +828,18 @@ module.exports = function(){
             return nq;
         };
 
-        this.commit = function(fields){
+        this.commit = function(fields, incremental){
             var nq = this._clone();
             nq.q = "commit";
             nq.stream = false;
             nq.body.commit_target = fields;
-            nq.queryString += ".commit({})".format(JSON.stringify(fields));
+            if(incremental){
+                nq.body.incremental = true;
+                nq.queryString += ".commit({}, true)".format(JSON.stringify(fields));
+            }
+            else{
+                nq.queryString += ".commit({})".format(JSON.stringify(fields));
+            }
             return nq;
         };
 
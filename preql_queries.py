@@ -6,6 +6,7 @@ import numpy
 import operator
 import itertools
 import os
+from collections import deque
 from uuid import uuid4
 
 
@@ -13,12 +14,10 @@ path = os.path.dirname(os.path.abspath(__file__))
 
 
 def insert(self, g_id, dbid, head, conn):
-    total_inserted = 0
-    total_replaced = 0
-    total_unchanged = 0
-    total_errors = 0
+    totals = {'inserted': 0, 'replaced': 0, 'unchanged': 0, 'errors': 0}
     failures = []
     batch = []
+    in_flight = deque()
     params = json.loads(head['params'])
     if 'conflict' not in params:
         params['conflict'] = "error"
@@ -28,51 +27,153 @@ def insert(self, g_id, dbid, head, conn):
         dur = params['durability']
     else:
         dur = 'hard'
+    sizing = {'batch_size': int(params.get('batch_size', self.chunk_limit))}
+    depth = max(1, int(params.get('pipeline_depth', 1)))
+    adaptive = params.get('adaptive', False)
 
-    def process_batch():
-        d = auto_reql(r.db(dbid).table(params['type']).insert(
-            batch, conflict=params['conflict'], durability=dur), conn)
+    def submit_batch():
+        if params['type'] == 'links':
+            try:
+                place_links(g_id, batch)
+            except ValueError, m:
+                #  The batch never reached the graph, so each of its links is reported rather than the request failing
+                if r_fail:
+                    failures.extend({'link': d, 'error': unicode(m)} for d in batch)
+                del batch[:]
+                return
+            flush_link_types(g_id, conn)
+        elif params['type'] == 'nodes':
+            flush_journal(g_id)
+        cache_docs(g_id, params['type'], batch, params['conflict'] == 'update')
+        forget_commits(g_id, params['type'])
+        in_flight.append(insert_pool.submit(
+            write_batch, dbid, params['type'], list(batch), conflict=params['conflict'], durability=dur))
         del batch[:]
-        return d
+
+    def collect_batch():
+        d, latency = in_flight.popleft().result()
+        for k in totals:
+            if k in d:
+                totals[k] += d[k]
+        if d.get('errors'):
+            stale_fields(g_id, params['type'])
+        if adaptive:
+            if latency < insert_target_latency / 2:
+                sizing['batch_size'] = min(sizing['batch_size'] * 2, insert_batch_limits[1])
+            elif latency > insert_target_latency:
+                sizing['batch_size'] = max(sizing['batch_size'] / 2, insert_batch_limits[0])
 
     if 'return_failures' in params:
         r_fail = params['return_failures']
     else:
         r_fail = True
-    for doc in tab_separate(cherrypy.request.body, delim=self.delim):
-        doc = json.loads(doc)
+    docs = read_records(cherrypy.request.body, delim=self.delim)
+    for doc in docs:
         try:
             to_add = graph_format[params['type']](g_id, doc, params['conflict'], conn)
+            #  Links are only placed when their batch is submitted, so pending ones count toward the limit here
+            if free_mode and params['type'] == 'links' and graphs[g_id].num_edges() + len(batch) >= free_limits['links']:
+                raise ValueError("This graph has already met it's limit of {} links".format(free_limits['links']))
             batch.append(to_add)
         except (ValueError, TypeError), m:
             if r_fail:
                 failures.append({params['type'][:-1]: doc, 'error': unicode(m)})
-        if len(batch) >= self.chunk_limit:
-            d = process_batch()
-            total_inserted += d['inserted']
-            if 'replaced' in d:
-                total_replaced += d['replaced']
-            if 'unchanged' in d:
-                total_unchanged += d['unchanged']
-            if 'errors' in d:
-                total_errors += d['errors']
+        if len(batch) >= sizing['batch_size']:
+            submit_batch()
+            while len(in_flight) >= depth:
+                collect_batch()
     if len(batch) > 0:
-        d = process_batch()
-        total_inserted += d['inserted']
-        if 'replaced' in d:
-            total_replaced += d['replaced']
-        if 'unchanged' in d:
-            total_unchanged += d['unchanged']
-        if 'errors' in d:
-            total_errors += d['errors']
-    answer = {'inserted': total_inserted, 'replaced': total_replaced, 'unchanged': total_unchanged,
-              'errors': total_errors}
+        submit_batch()
+    while len(in_flight) > 0:
+        collect_batch()
+    if params['type'] == 'link_types':
+        forget_link_types(g_id)
+    answer = dict(totals)
     if r_fail:
         answer['failures'] = failures
 
     return json.dumps(answer)
 
 
+def bulk_load(self, g_id, dbid, head, conn):
+    totals = {'inserted': 0, 'replaced': 0, 'unchanged': 0, 'errors': 0}
+    failures = []
+    in_flight = deque()
+    params = json.loads(head['params'])
+    fmt = params.get('format', 'npy')
+    try:
+        columns = read_columns(cherrypy.request.body, params)
+    except (ValueError, KeyError, IOError, StopIteration), m:
+        return json.dumps({'error': errors['bulk_load'](g_id, fmt, unicode(m))})
+    if 'origin' not in columns or 'terminus' not in columns:
+        return json.dumps({'error': errors['bulk_load'](g_id, fmt, "'origin' and 'terminus' columns are required.")})
+    num_rows = len(columns['origin'])
+    if any(len(col) != num_rows for col in columns.values()):
+        return json.dumps({'error': errors['bulk_load'](g_id, fmt, "All columns must have the same length.")})
+    r_fail = params.get('return_failures', True)
+    batch_size = int(params.get('batch_size', insert_batch_limits[1]))
+    write_params = {'conflict': params.get('conflict', 'error'), 'durability': params.get('durability', 'hard')}
+
+    g = graphs[g_id]
+    origins = resolve_endpoints(g_id, columns['origin'], conn)
+    termini = resolve_endpoints(g_id, columns['terminus'], conn)
+    num_nodes = g.num_vertices()
+    valid = (origins >= 0) & (origins < num_nodes) & (termini >= 0) & (termini < num_nodes)
+    if free_mode:
+        valid &= numpy.cumsum(valid) <= free_limits['links'] - g.num_edges()
+    invalid = numpy.flatnonzero(~valid)
+    if r_fail and len(invalid) > 0:
+        for o, t in itertools.izip(columns['origin'][invalid].tolist(), columns['terminus'][invalid].tolist()):
+            failures.append({'link': {'origin': o, 'terminus': t},
+                             'error': 'Origin or Terminus Node not found, or the link limit was reached.'})
+    rows = numpy.flatnonzero(valid)
+    try:
+        links = add_link_batch(g_id, numpy.column_stack([origins[rows], termini[rows]]))
+    except ValueError, m:
+        return json.dumps({'error': errors['bulk_load'](g_id, fmt, unicode(m))})
+
+    fields = [k for k in columns if k not in ['origin', 'terminus']]
+
+    def collect_batch():
+        d, latency = in_flight.popleft().result()
+        for k in totals:
+            if k in d:
+                totals[k] += d[k]
+        if d.get('errors'):
+            stale_fields(g_id, 'links')
+
+    for start in xrange(0, len(rows), batch_size):
+        chunk = rows[start:start + batch_size]
+        values = [columns[k][chunk].tolist() for k in fields]
+        batch = []
+        for i, (o, eid, t) in enumerate(links[start:start + batch_size].tolist()):
+            doc = {k: v[i] for k, v in itertools.izip(fields, values)}
+            doc['id'] = '{}_{}_{}'.format(o, eid, t)
+            if 'type' not in doc:
+                doc['type'] = 'Link'
+            if 'uid' not in doc:
+                doc['uid'] = str(uuid4())
+            lt = get_link_type(g_id, doc['type'], conn)
+            if 'value' not in doc:
+                doc['value'] = lt['min']
+            elif lt['function'] == "elastic":
+                widen_link_type(g_id, lt, doc['value'])
+            index_uid(link_uids, g_id, doc['uid'], doc['id'])
+            batch.append(doc)
+        flush_link_types(g_id, conn)
+        cache_docs(g_id, 'links', batch, write_params['conflict'] == 'update')
+        forget_commits(g_id, 'links')
+        in_flight.append(insert_pool.submit(write_batch, dbid, 'links', batch, **write_params))
+        while len(in_flight) >= insert_workers:
+            collect_batch()
+    while len(in_flight) > 0:
+        collect_batch()
+    answer = dict(totals)
+    if r_fail:
+        answer['failures'] = failures
+    return json.dumps(answer)
+
+
 def create_graph(self, g_id, dbid, head, conn):
     return json.dumps(create_graph(g_id, c=conn))
 
@@ -85,6 +186,8 @@ def drop_graph(self, g_id, dbid, head, conn):
     except r.ReqlOpFailedError:
         pass
     purge_graph(g_id)
+    drop_snapshot(g_id)
+    drop_stored_maps(g_id)
     return json.dumps({'graphs_dropped': 1, 'nodes_deleted': num_nodes, 'links_deleted': num_links})
 
 
@@ -177,10 +280,10 @@ def qstream(self, g_id, dbid, head, conn):
                 if 'coerce_to' in body and body['coerce_to'] == 'property_map':
                     if ot == 'nodes':
                         return json.dumps(
-                            node_property_map(g_id, body['pmap_name'], body['pmap_type'], map_func, conn))
+                            node_property_map(g_id, body['pmap_name'], body['pmap_type'], body['map'], conn))
                     elif ot == 'links':
                         return json.dumps(
-                            link_property_map(g_id, body['pmap_name'], body['pmap_type'], map_func, conn))
+                            link_property_map(g_id, body['pmap_name'], body['pmap_type'], body['map'], conn))
         if 'nested' in body:
             nested = body['nested']
             whole_table = False
@@ -202,6 +305,8 @@ def qstream(self, g_id, dbid, head, conn):
             if 'reverse' in body['sort'] and body['sort']['reverse']:
                 ob = r.desc(ob)
             qu = qu.order_by(ob)
+        if 'skip' in body:
+            qu = qu.skip(body['skip'])
         if 'limit' in body:
             qu = qu.limit(body['limit'])
         if count:
@@ -225,21 +330,84 @@ def qstream(self, g_id, dbid, head, conn):
 
         pm = property_maps[g_id][body['property_map']]
         key_type = pm.key_type()
+        binary = body.get('coerce_to') == 'binary'
+        #  None means rows go through pm[key] one at a time, which has no array form to export
+        data = property_maps[g_id].array_values(body['property_map'])
+        if binary and data is None:
+            value_type = pm.value_type() if pm.value_type() in object_value_types else 'ragged ' + pm.value_type()
+            return json.dumps({'error': errors['binary_export'](
+                g_id, ot, body['property_map'], value_type)}) + self.delim
 
         def pm_stream():
             g = graphs[g_id]
-            if 'sort' in body:
+            skip = body.get('skip', 0)
+            limit = body.get('limit')
+            ranking = 'sort' in body or 'value_range' in body
+
+            def value_of(key):
+                if 'Vector' in type(pm[key]).__name__:
+                    return list(pm[key])
+                return pm[key]
+
+            #  Rows go out in chunks sliced straight from the value array, unless the map holds python objects.
+            #  Binary exports take the selection as one block, and positions=None means every row in storage order.
+            #  ids=None names each row after its link, formatted one chunk at a time.
+            def emit(ids, positions, links=None, plain=True):
+                if positions is None:
+                    step = len(data) if binary else stream_chunk_size
+                    for start in xrange(0, max(len(data), 1), max(step, 1)):
+                        yield RowBlock(ids[start:start + step], data[start:start + step], plain)
+                    return
+                positions = numpy.asarray(positions, dtype=numpy.int64)
+                if data is None:
+                    for i in xrange(len(positions)):
+                        if links is None:
+                            key = int(positions[i])
+                        else:
+                            o, eid, t = links[i]
+                            key = get_edge(g, int(o), int(t), int(eid))
+                        row_id = '{}_{}_{}'.format(*links[i]) if ids is None else ids[i]
+                        yield [row_id, value_of(key)]
+                    return
+                step = len(positions) if binary else stream_chunk_size
+                for start in xrange(0, max(len(positions), 1), max(step, 1)):
+                    stop = start + step
+                    chunk_ids = link_strs(links[start:stop]) if ids is None else ids[start:stop]
+                    yield RowBlock(chunk_ids, data[positions[start:stop]], plain)
+
+            if ranking:
                 if 'vector' in pm.value_type():
-                    yield json.dumps({'error': errors['property_map_sort'](
-                        g_id, body['property_map'], pm.value_type(), body['sort'])}) + self.delim
+                    yield {'error': errors['property_map_sort'](
+                        g_id, body['property_map'], pm.value_type(), body.get('sort', body.get('value_range')))}
                     raise StopIteration
-                if 'kind' in body['sort']:
-                    kind = body['sort']['kind']
-                else:
-                    kind = "quicksort"
-                ind_order = numpy.argsort(pm.get_array(), kind=kind)
-                if 'reverse' in body['sort'] and body['sort']['reverse']:
-                    ind_order = ind_order[::-1]
+                kind = None
+                reverse = False
+                if 'sort' in body:
+                    if 'kind' in body['sort']:
+                        kind = body['sort']['kind']
+                    else:
+                        kind = "quicksort"
+                    reverse = 'reverse' in body['sort'] and body['sort']['reverse']
+                values = pm.get_array()
+
+                #  Rank only the selected rows, by their positions in the property map
+                def ranked(rows, positions):
+                    order = select_order(values[positions], kind, reverse, skip, limit, body.get('value_range'))
+                    return [rows[i] for i in order]
+
+                #  valid masks out free slots in the map, so they never take up room in skip or limit
+                def full_order(valid=None):
+                    order = None
+                    if kind is not None:
+                        #  A cached full sort beats partitioning, but top-k alone never pays for one
+                        order = sorted_order(g_id, body['property_map'], kind, values, compute=limit is None)
+                    if valid is None:
+                        return select_order(values, kind, reverse, skip, limit, body.get('value_range'), order)
+                    if order is not None:
+                        order = order[valid[order]]
+                        return select_order(values, kind, reverse, skip, limit, body.get('value_range'), order)
+                    positions = numpy.flatnonzero(valid)
+                    return positions[select_order(values[positions], kind, reverse, skip, limit, body.get('value_range'))]
             if key_type == "v":
                 qu = r.db(dbid).table('nodes')
                 if 'get_all' in body:
@@ -254,49 +422,44 @@ def qstream(self, g_id, dbid, head, conn):
                     qu = qu.filter(filt_func)
                 if uids:
                     qu = qu.map(lambda node: (node['id'], node['uid']))
-                    if 'sort' in body:
-                        tripples = [[n_id, uid, numpy.where(ind_order == n_id)[0][0]] for n_id, uid in
-                                    auto_reql(qu, conn)]
-                        pull_order = sorted(tripples, key=operator.itemgetter(2))
-                        if 'limit' in body:
-                            pull_order = pull_order[:body['limit']]
-                        pull_order = [(x, y) for x, y, z in pull_order]
+                    if ranking:
+                        rows = list(auto_reql(qu, conn))
+                        pull_order = [ranked(rows, numpy.array([n_id for n_id, uid in rows], dtype=numpy.int64))]
                     else:
-                        if 'limit' in body:
-                            qu = qu.limit(body['limit'])
-                        pull_order = auto_reql(qu, conn)
-                    for n_id, uid in pull_order:
-                        if 'vector' in type(pm[n_id]).__name__:
-                            vd = list(pm[n_id])
-                        else:
-                            vd = pm[n_id]
-                        yield [uid, vd]
+                        if skip:
+                            qu = qu.skip(skip)
+                        if limit is not None:
+                            qu = qu.limit(limit)
+                        pull_order = chunked(auto_reql(qu, conn))
+                    for chunk in pull_order:
+                        for block in emit([uid for n_id, uid in chunk], [n_id for n_id, uid in chunk], plain=False):
+                            yield block
                 else:
                     if 'get_all' in body or 'filter' in body:
                         qu = qu['id']
-                        if 'sort' in body:
-                            doubles = [[n_id, numpy.where(ind_order == n_id)[0][0]] for n_id in auto_reql(qu, conn)]
-                            selection = sorted(doubles, key=operator.itemgetter(1))
-                            if 'limit' in body:
-                                selection = selection[:body['limit']]
-                            selection = [x for x, y in selection]
+                        if ranking:
+                            rows = list(auto_reql(qu, conn))
+                            selection = [ranked(rows, numpy.array(rows, dtype=numpy.int64))]
                         else:
-                            if 'limit' in body:
-                                qu = qu.limit(body['limit'])
-                            selection = auto_reql(qu, conn)
+                            if skip:
+                                qu = qu.skip(skip)
+                            if limit is not None:
+                                qu = qu.limit(limit)
+                            selection = chunked(auto_reql(qu, conn))
                     else:
-                        if 'sort' in body:
-                            selection = ind_order
+                        if ranking:
+                            selection = [full_order()]
                         else:
-                            selection = g.vertices()
-                        if 'limit' in body:
-                            selection = itertools.islice(selection, body['limit'])
-                    for v in selection:
-                        if 'Vector' in type(pm[v]).__name__:
-                            vd = list(pm[v])
-                        else:
-                            vd = pm[v]
-                        yield [int(v), vd]
+                            vertices = g.get_vertices()
+                            if data is not None and not skip and limit is None and len(vertices) == len(data):
+                                for block in emit(vertices, None):
+                                    yield block
+                                raise StopIteration
+                            selection = [vertices[skip:None if limit is None else skip + limit]]
+                    for chunk in selection:
+                        chunk = numpy.asarray(chunk, dtype=numpy.int64)
+                        for block in emit(chunk, chunk):
+                            yield block
             elif key_type == "e":
                 qu = r.db(dbid).table('links')
                 if 'get_all' in body:
@@ -310,65 +473,75 @@ def qstream(self, g_id, dbid, head, conn):
                         filt_func = r.js(filt_func)
                     qu = qu.filter(filt_func)
                 if uids:
-                    qu = qu.map(lambda link: (link['id'].split('_'), link['uid']))
-                    if 'sort' in body:
-                        def edge_tripples(l_id, uid):
-                            o, eid, t = [int(v) for v in l_id]
-                            e = get_edge(g, o, t, eid)
-                            return [e, uid, numpy.where(ind_order == g.edge_index[e])[0][0]]
-
-                        tripples = [edge_tripples(l_id, uid) for l_id, uid in auto_reql(qu, conn)]
-                        pull_order = sorted(tripples, key=operator.itemgetter(2))
-                        if 'limit' in body:
-                            pull_order = pull_order[:body['limit']]
-                        pull_order = [(x, y) for x, y, z in pull_order]
-                        for e, uid in pull_order:
-                            yield [uid, pm[e]]
+                    qu = qu.map(lambda link: (link['id'], link['uid']))
+                    if ranking:
+                        rows = list(auto_reql(qu, conn))
+                        links = parse_link_ids([l_id for l_id, uid in rows])
+                        idx = edge_indices(g, links)
+                        found = numpy.flatnonzero(idx >= 0)
+                        pulled = [ranked(found, idx[found])]
                     else:
-                        if 'limit' in body:
-                            qu = qu.limit(body['limit'])
-                        for l_id, uid in auto_reql(qu, conn):
-                            es = g.edge(l_id[0], l_id[2], all_edges=True)
-                            for e in es:
-                                if g.edge_properties['id'][e] == int(l_id[1]):
-                                    if 'Vector' in type(pm[e]).__name__:
-                                        ed = list(pm[e])
-                                    else:
-                                        ed = pm[e]
-                                    yield [uid, ed]
+                        if skip:
+                            qu = qu.skip(skip)
+                        if limit is not None:
+                            qu = qu.limit(limit)
+                        pulled = None
+                    for chunk in pulled or chunked(auto_reql(qu, conn)):
+                        if pulled is None:
+                            rows = chunk
+                            links = parse_link_ids([l_id for l_id, uid in rows])
+                            idx = edge_indices(g, links)
+                            chunk = numpy.flatnonzero(idx >= 0)
+                        chunk = numpy.asarray(chunk, dtype=numpy.int64)
+                        for block in emit([rows[i][1] for i in chunk], idx[chunk], links[chunk], plain=False):
+                            yield block
                 else:
                     if 'get_all' in body or 'filter' in body:
-                        qu = qu['id'].map(lambda val: val.split('_'))
-                        if 'sort' in body:
-                            def get_doubles(o, eid, t):
-                                e = get_edge(g_id, int(o), int(t), int(eid))
-                                return [e, numpy.where(ind_order == g.edge_index[e])[0][0]]
-
-                            doubles = [get_doubles(o, eid, t) for [o, eid, t] in auto_reql(qu, conn)]
-                            selection = sorted(doubles, key=operator.itemgetter(1))
-                            if 'limit' in body:
-                                selection = selection[:body['limit']]
-                            selection = [x for [x, y] in selection]
+                        qu = qu['id']
+                        if ranking:
+                            links = parse_link_ids(list(auto_reql(qu, conn)))
+                            idx = edge_indices(g, links)
+                            found = numpy.flatnonzero(idx >= 0)
+                            order = numpy.asarray(ranked(found, idx[found]), dtype=numpy.int64)
+                            selection = [(links[order], idx[order])]
                         else:
-                            selection = [get_edge(g, int(o), int(t), int(eid)) for [o, eid, t] in auto_reql(qu, conn)]
+                            if skip:
+                                qu = qu.skip(skip)
+                            if limit is not None:
+                                qu = qu.limit(limit)
+
+                            def lookup(chunks):
+                                for chunk in chunks:
+                                    links = parse_link_ids(chunk)
+                                    idx = edge_indices(g, links)
+                                    found = idx >= 0
+                                    yield links[found], idx[found]
+                            selection = lookup(chunked(auto_reql(qu, conn)))
                     else:
-                        if 'sort' in body:
-                            id_map = numpy.empty(g.num_edges(), dtype='object')
-                            for e in g.edges():
-                                id_map[g.edge_index[e]] = e
-                            selection = [id_map[ind] for ind in ind_order]
-                        else:
-                            selection = g.edges()
-                        if 'limit' in body:
-                            selection = itertools.islice(selection, body['limit'])
-                    for e in selection:
-                        if 'Vector' in type(pm[e]).__name__:
-                            ed = list(pm[e])
+                        if ranking:
+                            table = edge_table(g_id, g)
+                            valid = numpy.zeros(len(values), dtype=bool)
+                            valid[:len(table)] = table[:len(values), 0] >= 0
+                            order = full_order(None if valid.all() else valid)
+                            selection = [(table[order], order)]
                         else:
-                            ed = pm[e]
-                        yield [get_edge_id(g_id, e, conn), ed]
-
-        stream = pm_stream()
+                            table = edge_table(g_id, g)
+                            order = numpy.flatnonzero(table[:, 0] >= 0)[skip:None if limit is None else skip + limit]
+                            selection = [(table[order], order)]
+                    for links, idx in selection:
+                        for block in emit(None, idx, links):
+                            yield block
+
+        def pm_export():
+            #  An empty selection still sends one block, so a binary reply keeps the map's dtype
+            sent = False
+            for block in pm_stream():
+                sent = True
+                yield block
+            if binary and not sent:
+                yield RowBlock(numpy.array([], dtype=numpy.int64), data[:0])
+
+        stream = pm_export()
 
         if 'coerce_to' in body:
             coerce_to = body['coerce_to']
@@ -383,12 +556,13 @@ def qstream(self, g_id, dbid, head, conn):
             }
             for k in property_maps[g_id]:
                 try:
+                    meta = property_maps[g_id].meta(k)
                     yield {
                         'id': k,
-                        'key_type': k_types[property_maps[g_id][k].key_type()],
-                        'value_type': property_maps[g_id][k].value_type()
+                        'key_type': k_types[meta['key_type']],
+                        'value_type': meta['value_type']
                     }
-                except AttributeError:
+                except (AttributeError, KeyError):
                     print k,
                     print property_maps[g_id][k]
 
@@ -400,17 +574,19 @@ def qstream(self, g_id, dbid, head, conn):
             return json.dumps(
                 {'error': errors['Nonexistence'][ot](g_id, body['array'])}) + self.delim
         stream = ndarrays[g_id][body['array']]
+        if body.get('coerce_to') == 'binary' and stream.dtype == object:
+            return json.dumps({'error': errors['binary_export'](g_id, ot, body['array'], 'object')}) + self.delim
     elif ot == "arrays":
         prep_pm(g_id)
 
         def arrays_stream():
             for k in ndarrays[g_id]:
-                yield {'id': k, 'value_type': str(ndarrays[g_id][k].dtype)}
+                yield {'id': k, 'value_type': ndarrays[g_id].meta(k)['value_type']}
 
         stream = arrays_stream()
     if 'coerce_to' in body:
         coerce_to = body['coerce_to']
-    return stream_gen(stream, event_stream, coerce_to, count)
+    return stream_gen(stream, event_stream, coerce_to, count, body.get('ids', False) or body.get('uids', False))
 
 
 def update(self, g_id, dbid, head, conn):
@@ -420,13 +596,20 @@ def update(self, g_id, dbid, head, conn):
         update = body['update']
         msg = errors['Nonexistence'][obj_type](g_id, obj_id)
         qu = r.db(dbid).table(obj_type + 's')
+        if obj_type == 'link_type':
+            forget_link_types(g_id)
+        cached = table_cache(g_id, obj_type + 's') is not None
+        forget_commits(g_id, obj_type + 's')
         if not uid:
             try:
-                dd = auto_reql(qu.get(obj_id).update(update), conn)
+                dd = auto_reql(qu.get(obj_id).update(update, return_changes=cached), conn)
             except r.ReqlNonExistenceError:
                 return json.dumps({'error': msg})
         else:
-            dd = auto_reql(qu.get_all(obj_id, index='uid').update(update), conn)
+            dd = auto_reql(qu.get_all(obj_id, index='uid').update(update, return_changes=cached), conn)
+        if cached:
+            cache_docs(g_id, obj_type + 's', [change['new_val'] for change in dd.pop('changes', [])
+                                              if change.get('new_val') is not None])
         return json.dumps(dd)
     elif obj_type in acceptable_types:
         update = body['update']
@@ -453,6 +636,11 @@ def update(self, g_id, dbid, head, conn):
                 filt_func = r.js(filt_func)
             qu = qu.filter(filt_func)
         d = auto_reql(qu.update(update), conn)
+        if obj_type == 'link_types':
+            forget_link_types(g_id)
+        else:
+            stale_fields(g_id, obj_type)
+            forget_commits(g_id, obj_type)
         return json.dumps(d)
 
 
@@ -482,15 +670,30 @@ def delete(self, g_id, dbid, head, conn):
         if 'get_all' not in body and 'filter' not in body:
             deleted = auto_reql(qu.delete(), conn)['deleted']
             resp = {obj_type + "_deleted": deleted}
+            stale_fields(g_id, {'node_types': 'nodes', 'link_types': 'links'}.get(obj_type, obj_type))
+            forget_commits(g_id, {'node_types': 'nodes', 'link_types': 'links'}.get(obj_type, obj_type))
+            if obj_type == "nodes":
+                stale_fields(g_id, 'links')
+                forget_commits(g_id, 'links')
             if obj_type == "links":
-                graphs[g_id].clear_edges()
+                with snapshot_lock:
+                    graphs[g_id].clear_edges()
+                    journal(g_id, 'clear_links')
+                invalidate_link_index(g_id)
+                link_uids.get(dbid, {}).clear()
             elif obj_type == "nodes":
-                graphs[g_id].clear()
+                with snapshot_lock:
+                    graphs[g_id].clear()
+                    journal(g_id, 'clear')
+                invalidate_link_index(g_id)
+                node_uids.get(dbid, {}).clear()
+                link_uids.get(dbid, {}).clear()
                 resp['links_deleted'] = auto_reql(r.db(dbid).table('links').delete(), conn)['deleted']
             elif obj_type == "node_types":
                 resp['nodes_updated'] = auto_reql(r.db(dbid).table('nodes').update(
                     {'type': 'Node'}), conn)['replaced']
             elif obj_type == "link_types":
+                forget_link_types(g_id)
                 resp['links_updated'] = auto_reql(r.db(dbid).table('links').update(
                     {'type': 'Link'}), conn)['replaced']
             return json.dumps(resp)
@@ -499,11 +702,11 @@ def delete(self, g_id, dbid, head, conn):
         msg = errors['Nonexistence'][obj_type](g_id, obj_id)
         obj_type += 's'
         if uid:
-            d = auto_reql(
-                r.db(dbid).table(obj_type).get_all(obj_id, index='uid')['id'].coerce_to('array'), conn)
-            if len(d) > 0:
-                obj_id = d[0]
+            if obj_type == 'nodes':
+                obj_id = find_node_uid(g_id, obj_id, conn)
             else:
+                obj_id = find_link_uid(g_id, obj_id, conn)
+            if obj_id is None:
                 return json.dumps({'error': msg})
         else:
             return json.dumps(
@@ -580,63 +783,96 @@ def commit(self, g_id, dbid, head, conn):
         fp = get_field_list(body['commit_target'])
         pm = property_maps[g_id][body['property_map']]
         key_type = pm.key_type()
-        val_type = pm.value_type()
         response = {'replaced': 0, 'unchanged': 0, 'skipped': 0, 'errors': 0}
-
-        def increment_response(rdb_response):
-            response['replaced'] += rdb_response['replaced']
-            response['unchanged'] += rdb_response['unchanged']
-            response['skipped'] += rdb_response['skipped']
-            response['errors'] += rdb_response['errors']
+        batch_size = int(body.get('batch_size', insert_batch_limits[1]))
+        in_flight = deque()
+        data = property_maps[g_id].array_values(body['property_map'])
 
         if key_type == "v":
-            for v in g.vertices():
-                val = pm[v]
-                try:
-                    if 'vector' in val_type:
-                        val = [invalid_float_replacer(x) for x in val]
-                    elif val_type == 'bool':
-                        val = bool(val)
-                    else:
-                        val = invalid_float_replacer(val)
-                    d = auto_reql(r.db(dbid).table('nodes').get(int(v)).update(
-                        update_formatter(fp, val)), conn)
-                    increment_response(d)
-                except (ValueError, TypeError) as err:
-                    print err
-                    print val
-                    print type(val).__name__
+            table = 'nodes'
+            positions = numpy.asarray(g.get_vertices(), dtype=numpy.int64)
+            ids = positions
+            links = None
         elif key_type == 'e':
-            for e in g.edges():
-                val = pm[e]
-                try:
-                    if 'Vector' in type(val).__name__:
-                        val = [invalid_float_replacer(x) for x in list(val)]
-                    else:
-                        val = invalid_float_replacer(val)
-                    d = auto_reql(
-                        r.db(dbid).table('links').get(get_edge_id(dbid, e, conn)).update(
-                            update_formatter(fp, val)), conn)
-                    increment_response(d)
-                except ValueError:
-                    print val
-                    print type(val).__name__
+            table = 'links'
+            links = edge_table(g_id, g)
+            positions = numpy.flatnonzero(links[:, 0] >= 0)
+            links = links[positions]
+            ids = link_strs(links)
+
+        #  The last incremental commit of each (map, target) lets the next one write only what changed.
+        #  Copies are only kept once incremental commits are asked for, and any write to the table drops them.
+        commit_key = (g_id, table, body['property_map'], json.dumps(body['commit_target'], sort_keys=True))
+        stamp = topology_versions.get(g_id, 0)
+        last = committed_maps.get(commit_key)
+        if body.get('incremental') and data is not None and last is not None and last[0] == stamp \
+                and last[1].shape == data.shape and last[1].dtype == data.dtype:
+            keep = numpy.flatnonzero(changed_rows(last[1][positions], data[positions]))
+            positions = positions[keep]
+            ids = ids[keep]
+            if links is not None:
+                links = links[keep]
+
+        def chunk_values(start, stop):
+            if data is not None:
+                return commit_values(data[positions[start:stop]])
+            vals = []
+            for i in xrange(start, stop):
+                if links is None:
+                    val = pm[int(positions[i])]
+                else:
+                    o, eid, t = links[i]
+                    val = pm[get_edge(g, int(o), int(t), int(eid))]
+                if 'Vector' in type(val).__name__:
+                    val = list(val)
+                vals.append(val)
+            return vals
+
+        progress = {'done': 0, 'start': time.time(), 'shown': time.time()}
+
+        def report():
+            elapsed = time.time() - progress['start']
+            print "    commit('{}'): {}/{} {} written, {:.0f}/s".format(
+                body['property_map'], progress['done'], len(positions), table, progress['done'] / max(elapsed, 1e-6))
+            progress['shown'] = time.time()
+
+        def collect_batch():
+            d, latency = in_flight.popleft().result()
+            for k in response:
+                if k in d:
+                    response[k] += d[k]
+            progress['done'] += sum(d.get(k, 0) for k in response)
+            if time.time() - progress['shown'] > 1:
+                report()
+
+        for start in xrange(0, len(positions), batch_size):
+            stop = min(start + batch_size, len(positions))
+            updates = [{'id': obj_id, 'update': update_formatter(fp, val)}
+                       for obj_id, val in itertools.izip(ids[start:stop].tolist(), chunk_values(start, stop))]
+            in_flight.append(insert_pool.submit(update_batch, dbid, table, updates))
+            while len(in_flight) >= insert_workers:
+                collect_batch()
+        while len(in_flight) > 0:
+            collect_batch()
+        report()
+        if len(positions) > 0:
+            stale_fields(g_id, table)
+        forget_commits(g_id, table)
+        if body.get('incremental') and data is not None and response['errors'] == 0:
+            committed_maps[commit_key] = (stamp, data.copy())
         return json.dumps(response)
 
 
 def graph_filter(self, g_id, dbid, head, conn):
     body = pickle.loads(cherrypy.request.body.read())
     filters = body['filter']
+    #  Filter maps belong to the view alone, so they never enter the graph's persistent store
     if 'nodes' in filters and filters['nodes'] is not None:
-        nf_name = str(uuid4())
-        nfn = node_property_map(g_id, nf_name, 'bool', filters['nodes'], conn)['property_map']
-        nf = property_maps[g_id][nfn]
+        nf = build_node_map(g_id, 'bool', filters['nodes'], conn)
     else:
         nf = None
     if 'links' in filters and filters['links'] is not None:
-        lf_name = str(uuid4())
-        lfn = link_property_map(g_id, lf_name, 'bool', filters['links'], conn)['property_map']
-        lf = property_maps[g_id][lfn]
+        lf = build_link_map(g_id, 'bool', filters['links'], conn)
     else:
         lf = None
     if 'directed' in filters and filters['directed'] is not None:
@@ -654,10 +890,8 @@ def graph_filter(self, g_id, dbid, head, conn):
     g2 = gt.GraphView(graphs[g_id], vfilt=nf, efilt=lf, directed=directed, reversed=rev)
     graphs[g2_id] = g2
     prep_pm(g2_id)
-    for pm in property_maps[g_id]:
-        property_maps[g2_id][pm] = property_maps[g_id][pm]
-    for nda in ndarrays[g_id]:
-        ndarrays[g2_id][nda] = ndarrays[g_id][nda]
+    property_maps[g2_id].parent = property_maps[g_id]
+    ndarrays[g2_id].parent = ndarrays[g_id]
     return json.dumps({'subgraph': g2_id})
 
 
@@ -693,9 +927,28 @@ def walk(self, g_id, dbid, head, conn):
 def fields(self, g_id, dbid, head, conn):
     obj_type = json.loads(head['params'])['type']
     if obj_type in acceptable_types:
-        fields = auto_reql(r.db(dbid).table(obj_type).map(lambda n: n.keys()).reduce(
-            lambda x, y: r.expr(x + y).distinct()), conn)
-        return json.dumps(fields)
+        fields = parallel_scan(g_id, obj_type, lambda qu: qu.concat_map(lambda n: n.keys()).distinct(), list)
+        return json.dumps(sorted(set(itertools.chain(*fields))))
+
+
+def cache_fields(self, g_id, dbid, head, conn):
+    params, body, obj_type, js_func, event_stream = p_b_ot()
+    if obj_type not in ['nodes', 'links']:
+        if obj_type in acceptable_types:
+            return json.dumps({'error': errors['SyntaxError'][obj_type](g_id, 'cache_fields')})
+        return json.dumps({'error': errors['SyntaxError']['graph'](g_id, 'cache_fields')})
+    caches = field_caches.setdefault(dbid, {})
+    fields = set(caches[obj_type].fields) if obj_type in caches else set()
+    if body.get('drop'):
+        fields -= set(body['fields'])
+    else:
+        fields |= set(body['fields'])
+    if fields:
+        caches[obj_type] = FieldCache(obj_type, sorted(fields))
+        caches[obj_type].rebuild(dbid, conn)
+    else:
+        caches.pop(obj_type, None)
+    return json.dumps({'cached_fields': sorted(fields)})
 
 
 def create_index(self, g_id, dbid, head, conn):
@@ -725,6 +978,7 @@ def graph_stats(self, g_id, dbid, head, conn):
         'num_links': graphs[g_id].num_edges(),
         'link_types': link_types,
         'node_types': node_types,
+        'state': 'ready'
     }
     if type(graphs[g_id]).__name__ == "GraphView":
         summary['filtered_from'] = graphs[g_id].base.graph_properties['id']
@@ -1157,19 +1411,19 @@ def shortest_path(g_id, conn, **kwargs):
         return params
     vlist, elist = gt.graph_tool.topology.shortest_path(g, **params)
     v_nums = [int(v) for v in vlist]
-    e_nums = [get_edge_id(g_id, e, conn) for e in elist]
+    e_keys = [edge_key(g, e) for e in elist]
     if uids:
-        vids = auto_reql(r.db(db_id(g_id)).table('nodes').get_all(v_nums).map(
+        vids = auto_reql(r.db(db_id(g_id)).table('nodes').get_all(*v_nums).map(
                 lambda node: (node['id'], node['uid'])), conn)
         v_ind = {k: v for (k, v) in vids}
-        vs = [v_ind[int(k)] for k in vlist]
-        eids = auto_reql(r.db(db_id(g_id)).table('links').get_all(e_nums).map(
+        vs = [v_ind[k] for k in v_nums]
+        eids = auto_reql(r.db(db_id(g_id)).table('links').get_all(*[link_str(k) for k in e_keys]).map(
                 lambda link: (link['id'], link['uid'])), conn)
-        e_ind = {k: v for (k, v) in eids}
-        es = [e_ind[get_edge_id(g_id, e, conn)] for e in elist]
+        e_ind = {parse_link(k): v for (k, v) in eids}
+        es = [e_ind[k] for k in e_keys]
     else:
         vs = v_nums
-        es = e_nums
+        es = [link_str(k) for k in e_keys]
     return {'nodes': vs, 'links': es}
 
 
@@ -1520,8 +1774,15 @@ def finalize_graph(g, g_id, conn, durability='hard'):
     g.graph_properties['id'] = g.new_graph_property('string')
     g.graph_properties['id'] = g_id
     g.edge_properties['id'] = g.new_edge_property('int16_t')
+    g.edge_properties['key'] = g.new_edge_property('int64_t')
     if g_id in graphs:
         return {'error': errors['IDDuplicates']['graph'](g_id)}
+    edges = g.get_edges()
+    pair_counts = numpy.unique((edges[:, 0].astype(numpy.int64) << 32) | edges[:, 1], return_counts=True)[1]
+    try:
+        check_link_ordinals(numpy.array([[0, pair_counts.max() - 1 if len(edges) else 0, 0]]))
+    except ValueError, m:
+        return {'error': errors['graph_size'](g_id, unicode(m))}
     try:
         auto_reql(r.db_create(g_id), conn)
     except r.ReqlOpFailedError:
@@ -1537,10 +1798,13 @@ def finalize_graph(g, g_id, conn, durability='hard'):
     auto_reql(r.db(db_id(g_id)).table('node_types').insert(graph_format['node_types']()), conn)
     auto_reql(r.db(db_id(g_id)).table('link_types').insert(graph_format['link_types']()), conn)
     g.set_directed(True)
+    node_uids[g_id] = {}
+    link_uids[g_id] = {}
     nodes = []
     links = []
     for v in g.vertices():
         nodes.append(def_node(v))
+        node_uids[g_id][nodes[-1]['uid']] = nodes[-1]['id']
         if len(nodes) >= 200:
             auto_reql(r.db(db_id(g_id)).table('nodes').insert(nodes), conn)
             del nodes[:]
@@ -1548,13 +1812,16 @@ def finalize_graph(g, g_id, conn, durability='hard'):
     del nodes[:]
     for e in g.edges():
         g.edge_properties['id'][e] = g.edge(e.source(), e.target(), all_edges=True).index(e)
+        set_link_key(g, e)
         links.append(def_link(g_id, e))
+        link_uids[g_id][links[-1]['uid']] = links[-1]['id']
         if len(links) >= 200:
             auto_reql(r.db(db_id(g_id)).table('links').insert(links), conn)
             del links[:]
     auto_reql(r.db(db_id(g_id)).table('links').insert(links), conn)
     del links[:]
     graphs[g_id] = g
+    save_snapshot(g_id)
     return {}
 
 
@@ -1870,7 +2137,7 @@ def connected_to(g_id, node_list, direction="out", uids=False, c=None, **kwargs)
         c = r.connect()
     g = prep_pm(g_id)
     if uids:
-        cursor = auto_reql(r.db(db_id(g_id)).table('nodes').get_all(*node_list, index='uid')['id'], c)
+        cursor = iter([v for v in (find_node_uid(g_id, uid, c) for uid in node_list) if v is not None])
         root = cursor.next()
     else:
         cursor = node_list
@@ -1946,12 +2213,12 @@ def clone_bfs2(g_id, node_id, conn, **kwargs):
                 discovered_nodes[lvl] += [int(v) for v in g1.vertex(n).in_neighbours() if int(v) != n_id]
         else:
             if out:
-                l_ids = [get_edge_id(g_id, e, conn) for e in g1.vertex(n).out_edges()]
+                l_ids = [link_str(edge_key(g1, e)) for e in g1.vertex(n).out_edges()]
                 r_query = auto_reql(r.db(db_id(g_id)).table('links').get_all(*l_ids).filter(filters[lvl-1]['link']).map(
                     lambda l: l['id'].split('_')), conn)
                 discovered_nodes[lvl] += [int(t) for o, e, t in r_query]
             else:
-                l_ids = [get_edge_id(g_id, e, conn) for e in g1.vertex(n).in_edges()]
+                l_ids = [link_str(edge_key(g1, e)) for e in g1.vertex(n).in_edges()]
                 r_query = auto_reql(r.db(db_id(g_id)).table('links').get_all(*l_ids).filter(filters[lvl-1]['link']).map(
                     lambda l: l['id'].split('_')), conn)
                 discovered_nodes[lvl] += [int(o) for o, e, t in r_query]
@@ -1982,10 +2249,10 @@ def clone_bfs2(g_id, node_id, conn, **kwargs):
                     v_id[v] = vid
                     node_map[vid] = v
                     for e in g1.vertex(vid).out_edges():
-                        yield get_edge_id(g_id, e, conn)
+                        yield edge_key(g1, e)
 
         def do_it(link):
-            [o, eid, t] = [int(val) for val in link.split('_')]
+            o, eid, t = unpack_link(link)
             try:
                 e = graph2.add_edge(node_map[o], node_map[t])
             except KeyError:
@@ -2106,6 +2373,7 @@ def breadth_first(g_id, node_id, conn, **kwargs):
     n_id = get_vertex_id(g_id, node_id, conn)
     if n_id is None:
         return {'error': errors['Nonexistence']['node'](g_id, node_id)}
+    g = graphs[g_id]
     node_map = {}
     link_map = {}
     discovered_nodes = [[n_id], []]
@@ -2136,18 +2404,16 @@ def breadth_first(g_id, node_id, conn, **kwargs):
                     else:
                         node_map[t] = [e_id]
             if filters is None or 'link' not in filters[lvl-1]:
-                for e in graphs[g_id].vertex(n).out_edges():
-                    t = int(e.target())
-                    o = int(e.source())
-                    do_it(get_edge_id(g_id, e, conn), o, t)
+                for e in g.vertex(n).out_edges():
+                    do_it(edge_key(g, e), int(e.source()), int(e.target()))
             else:
-                l_ids = [get_edge_id(g_id, e, conn) for e in graphs[g_id].vertex(n).out_edges()]
+                l_ids = [link_str(edge_key(g, e)) for e in g.vertex(n).out_edges()]
                 if len(l_ids) > 0:
                     for o, e, t in auto_reql(r.db(db_id(g_id)).table('links').get_all(*l_ids).filter(filters[lvl-1]['link']).map(
                             lambda l: l['id'].split('_')), conn):
                         o = int(o)
                         t = int(t)
-                        do_it("{}_{}_{}".format(o, e, t), o, t)
+                        do_it(pack_link(o, int(e), t), o, t)
         else:
             def do_it(e_id, o, t):
                 if o == n_id:
@@ -2160,18 +2426,16 @@ def breadth_first(g_id, node_id, conn, **kwargs):
                     else:
                         node_map[o] = [e_id]
             if filters is None or 'link' not in filters[lvl-1]:
-                for e in graphs[g_id].vertex(n).in_edges():
-                    t = int(e.target())
-                    o = int(e.source())
-                    do_it(get_edge_id(g_id, e, conn), o, t)
+                for e in g.vertex(n).in_edges():
+                    do_it(edge_key(g, e), int(e.source()), int(e.target()))
             else:
-                l_ids = [get_edge_id(g_id, e, conn) for e in graphs[g_id].vertex(n).in_edges()]
+                l_ids = [link_str(edge_key(g, e)) for e in g.vertex(n).in_edges()]
                 if len(l_ids) > 0:
                     for o, e, t in auto_reql(r.db(db_id(g_id)).table('links').get_all(*l_ids).filter(filters[lvl-1]['link']).map(
                             lambda l: l['id'].split('_')), conn):
                         o = int(o)
                         t = int(t)
-                        do_it("{}_{}_{}".format(o, e, t), o, t)
+                        do_it(pack_link(o, int(e), t), o, t)
 
     def nfilt_tier(lvl):
         if filters is not None and 'node' in filters[lvl-1]:
@@ -2209,8 +2473,9 @@ def breadth_first(g_id, node_id, conn, **kwargs):
                 return l['id'], kwargs['lmap'](l)
         for tier in discovered_links:
             if len(tier) > 0:
-                for l_id, l_val in auto_reql(r.db(db_id(g_id)).table('links').get_all(*tier).map(l_map), conn):
-                    link_map[l_id] = l_val
+                for l_id, l_val in auto_reql(r.db(db_id(g_id)).table('links').get_all(
+                        *[link_str(k) for k in tier]).map(l_map), conn):
+                    link_map[parse_link(l_id)] = l_val
         if 'reduce' in kwargs:
             if 'js_func' in kwargs:
                 d = {k: r.expr([link_map[vv] for vv in v]).reduce(r.js(kwargs['reduce'])).run(conn) for k, v in node_map.iteritems()}
@@ -2220,7 +2485,7 @@ def breadth_first(g_id, node_id, conn, **kwargs):
                 return sorted(d.items(), key=operator.itemgetter(1), **kwargs['sort'])
             return d
         return {k: [link_map[vv] for vv in v] for k, v in node_map.iteritems()}
-    return node_map
+    return {k: [link_str(vv) for vv in v] for k, v in node_map.iteritems()}
 
 
 #  Basics
@@ -2273,14 +2538,17 @@ def add_node(g_id, node_data, conflict, conn):
             v_id = node_data['id']
         elif 'uid' in node_data:
             if node_data['uid'] != '':
-                v_id = get_vertex_id(g_id, node_data['uid'], conn)
+                v_id = find_node_uid(g_id, node_data['uid'], conn)
             else:
                 del node_data['uid']
     if v_id is None:
-        v_id = int(graphs[g_id].add_vertex())
+        with snapshot_lock:
+            v_id = int(graphs[g_id].add_vertex())
+            journal_nodes(g_id)
     node_data['id'] = v_id
     if 'uid' not in node_data:
         node_data['uid'] = str(uuid4())
+    index_uid(node_uids, g_id, node_data['uid'], v_id)
     return node_data
 
 
@@ -2291,54 +2559,40 @@ def add_link(g_id, link_data, conflict, conn):
         raise ValueError("Links require an 'origin' and 'terminus'.")
     if type(link_data['origin']).__name__ in ['str', 'unicode']:
         link_data['origin'] = unquote(link_data['origin'])
-        d = auto_reql(r.db(db_id(g_id)).table('nodes').get_all(link_data['origin'], index='uid')['id'].coerce_to('array'), conn)
-        if len(d) == 0:
+        o = find_node_uid(g_id, link_data['origin'], conn)
+        if o is None:
             raise ValueError('Origin Node with UID %s not found.' % link_data['origin'])
-        o = d[0]
     elif type(link_data['origin']).__name__ in ['int']:
         o = link_data['origin']
     else:
         raise TypeError("'origin' field requires an integer(short) for a numerical ID, or a string for uid.")
     if type(link_data['terminus']).__name__ in ['str', 'unicode']:
         link_data['terminus'] = unquote(link_data['terminus'])
-        d = auto_reql(r.db(db_id(g_id)).table('nodes').get_all(link_data['terminus'], index='uid')['id'].coerce_to('array'), conn)
-        if len(d) == 0:
+        t = find_node_uid(g_id, link_data['terminus'], conn)
+        if t is None:
             raise ValueError('Terminus Node with UID %s not found.' % link_data['terminus'])
-        t = d[0]
     elif type(link_data['terminus']).__name__ in ['int']:
         t = link_data['terminus']
     else:
         raise TypeError("'terminus' field requires an integer(short) for a numerical ID, or a string for uid.")
-    g = graphs[g_id]
-    es = g.edge(o, t, all_edges=True)
-    l_id = len(es)
-    e = g.add_edge(o, t)
-    g.edge_properties['id'][e] = l_id
-    link_data['id'] = '{}_{}_{}'.format(o, l_id, t)
+    num_nodes = graphs[g_id].num_vertices()
+    if not 0 <= o < num_nodes:
+        raise ValueError('Origin Node %s not found.' % o)
+    if not 0 <= t < num_nodes:
+        raise ValueError('Terminus Node %s not found.' % t)
+    #  The link id is assigned when the batch is placed in the graph, see place_links
+    link_data['origin'] = o
+    link_data['terminus'] = t
     if 'type' not in link_data:
         link_data['type'] = "Link"
-    try:
-        lt = auto_reql(r.db(db_id(g_id)).table('link_types').get(link_data['type']), conn)
-    except r.ReqlNonExistenceError:
-        lt = graph_format['link_types']({'id': link_data['type']})
-        auto_reql(r.db(db_id(g_id)).table('link_types').insert(lt), conn)
+    lt = get_link_type(g_id, link_data['type'], conn)
     if 'value' not in link_data:
         link_data['value'] = lt['min']
     elif lt['function'] == "elastic":
-        change = True
-        if link_data['value'] < lt['min']:
-            lt['min'] = link_data['value']
-        elif link_data['value'] > lt['max']:
-            lt['max'] = link_data['value']
-        else:
-            change = False
-        if change:
-            auto_reql(r.db(db_id(g_id)).table('link_types').get(lt['id']).update(lt), conn)
+        widen_link_type(g_id, lt, link_data['value'])
 
     if 'uid' not in link_data:
         link_data['uid'] = str(uuid4())
-    del link_data['origin']
-    del link_data['terminus']
     return link_data
 
 
@@ -2357,22 +2611,40 @@ def remove_link(g_id, link_id, c=None):
     es = g.edge(o, t, all_edges=True)
     for e in es:
         if g.edge_properties['id'][e] == li[1]:
-            g.remove_edge(e)
-            auto_reql(r.db(db_id(g_id)).table('links').get(link_id).delete(), c)
+            cache_clear(g_id, 'links', [int(g.edge_index[e])])
+            with snapshot_lock:
+                g.remove_edge(e)
+                journal(g_id, 'remove_link', *li)
+            if g_id in link_indexes:
+                link_indexes[g_id].remove(*li)
+            d = auto_reql(r.db(db_id(g_id)).table('links').get(link_id).delete(return_changes=True), c)
+            for change in d['changes']:
+                index_uid(link_uids, g_id, change['old_val']['uid'], None)
             break
-    es = g.edge(o, t, all_edges=True)
+    #  Renumber in ordinal order, so no ordinal is ever held by two links at once, here or on journal replay
+    es = sorted(g.edge(o, t, all_edges=True), key=lambda e: g.edge_properties['id'][e])
     updated = {}
     if len(es) > 0:
         inserts = []
         deletes = []
+        relabelled = []
         for i, e in enumerate(es):
-            e_id = '{}_{}_{}'.format(int(e.source()), g.edge_properties['id'][e], int(e.target()))
+            old = int(g.edge_properties['id'][e])
+            e_id = '{}_{}_{}'.format(int(e.source()), old, int(e.target()))
             deletes.append(e_id)
             d = auto_reql(r.db(db_id(g_id)).table('links').get(e_id), c)
-            g.edge_properties['id'][e] = i
-            d['id'] = '{}_{}_{}'.format(int(e.source()), i, int(e.source()))
+            if old != i:
+                with snapshot_lock:
+                    journal(g_id, 'relabel_link', int(e.source()), old, int(e.target()), i)
+                    g.edge_properties['id'][e] = i
+                    set_link_key(g, e)
+                relabelled.append(((int(e.source()), old, int(e.target())), i))
+            d['id'] = '{}_{}_{}'.format(int(e.source()), i, int(e.target()))
             updated[d['uid']] = {'old_id': e_id, 'new_id': d['id']}
+            index_uid(link_uids, g_id, d['uid'], d['id'])
             inserts.append(d)
+        if g_id in link_indexes and len(relabelled) > 0:
+            link_indexes[g_id].relabel([l for l, i in relabelled], [i for l, i in relabelled])
         auto_reql(r.db(db_id(g_id)).table('links').get_all(*deletes).delete(), c)
         auto_reql(r.db(db_id(g_id)).table('links').insert(inserts), c)
     return {'links_deleted': 1, 'links_updated': updated}
@@ -2388,14 +2660,22 @@ def remove_node(g_id, node_id, c=None):
     swap_old_id = g.num_vertices()-1
     if node_id == swap_old_id:
         try:
-            links_to_delete = ['{}_{}_{}'.format(e.source(), g.edge_properties['id'][e], e.target()) for e in
-                               g.vertex(node_id).all_edges()]
+            links_to_delete = [link_str(edge_key(g, e)) for e in g.vertex(node_id).all_edges()]
         except ValueError:
             return {'error': errors['Nonexistence']['node'](g_id, node_id)}
         del_link_uids = auto_reql(r.db(dbid).table('links').get_all(*links_to_delete)['uid'].coerce_to('array'), c)
-        g.remove_vertex(node_id)
+        cache_clear(g_id, 'links', [int(g.edge_index[e]) for e in g.vertex(node_id).all_edges()])
+        cache_clear(g_id, 'nodes', [node_id])
+        with snapshot_lock:
+            g.remove_vertex(node_id)
+            journal(g_id, 'remove_node', node_id)
+        invalidate_link_index(g_id)
         auto_reql(r.db(dbid).table('links').get_all(*links_to_delete).delete(), c)
-        auto_reql(r.db(dbid).table('nodes').get(node_id).delete(), c)
+        d = auto_reql(r.db(dbid).table('nodes').get(node_id).delete(return_changes=True), c)
+        for change in d['changes']:
+            index_uid(node_uids, g_id, change['old_val']['uid'], None)
+        for uid in del_link_uids:
+            index_uid(link_uids, g_id, uid, None)
         return {
             'nodes_deleted': 1,
             'links_deleted': del_link_uids,
@@ -2411,19 +2691,24 @@ def remove_node(g_id, node_id, c=None):
 
     #  Get the links that will need to be deleted, because they are attached to the root node.
     try:
-        links_to_delete = ['{}_{}_{}'.format(e.source(), g.edge_properties['id'][e], e.target()) for e in
-                       g.vertex(node_id).all_edges()]
+        links_to_delete = [link_str(edge_key(g, e)) for e in g.vertex(node_id).all_edges()]
     except ValueError:
         return {'error': errors['Nonexistence']['node'](g_id, node_id)}
 
     del_link_uids = auto_reql(r.db(dbid).table('links').get_all(*links_to_delete)['uid'].coerce_to('array'), c)
 
     #  Get links that will need to be updated to accommodate the swap
-    links_to_update = ['{}_{}_{}'.format(int(l.source()), g.edge_properties['id'][l], int(l.target())) for l in
-                       swap.all_edges()]
+    links_to_update = [link_str(edge_key(g, l)) for l in swap.all_edges()]
 
     #  Delete the vertex to be deleted, and delete the associated links from rethink as well
-    g.remove_vertex(node_id, fast=True)
+    cache_clear(g_id, 'links', [int(g.edge_index[e]) for e in g.vertex(node_id).all_edges()])
+    cache_move(g_id, 'nodes', swap_old_id, swap_new_id)
+    with snapshot_lock:
+        g.remove_vertex(node_id, fast=True)
+        journal(g_id, 'remove_node', node_id)
+        for e in g.vertex(swap_new_id).all_edges():
+            set_link_key(g, e)
+    invalidate_link_index(g_id)
     auto_reql(r.db(dbid).table('links').get_all(*links_to_delete).delete(), c)
 
     #  Get the document for the swap node
@@ -2434,24 +2719,31 @@ def remove_node(g_id, node_id, c=None):
     d['id'] = swap_new_id
 
     #  Replace the deleted node document with the swap node document
-    auto_reql(r.db(dbid).table('nodes').get(swap_new_id).replace(d), c)
+    replaced = auto_reql(r.db(dbid).table('nodes').get(swap_new_id).replace(d, return_changes=True), c)
+    for change in replaced['changes']:
+        index_uid(node_uids, g_id, change['old_val']['uid'], None)
+    index_uid(node_uids, g_id, swap_uid, swap_new_id)
+    for uid in del_link_uids:
+        index_uid(link_uids, g_id, uid, None)
 
     #  Delete the old swap node document
     auto_reql(r.db(dbid).table('nodes').get(swap_old_id).delete(), c)
 
     #  Get all the old link documents
-    old_ld = auto_reql(r.db(dbid).table('links').get_all(*links_to_update), c)
+    old_ld = auto_reql(r.db(dbid).table('links').get_all(*links_to_update).coerce_to('array'), c)
     updated_links = {}
     for l in old_ld:
         old_l_id = l['id']
-        l_i = old_l_id.split('_')
+        l_i = [int(v) for v in old_l_id.split('_')]
         #  If the swap node was the origin, change the id to reflect the new origin id
         if l_i[0] == swap_old_id:
-            l['id'] = '{}_{}_{}'.format(swap_new_id, l_i[1], l_i[2])
-        # If the swap node was the terminus, change the id to reflect the new origin id
-        elif l_i[2] == swap_old_id:
-            l['id'] = '{}_{}_{}'.format(l_i[0], l_i[1], swap_new_id)
+            l_i[0] = swap_new_id
+        # If the swap node was the terminus, change the id to reflect the new terminus id
+        if l_i[2] == swap_old_id:
+            l_i[2] = swap_new_id
+        l['id'] = '{}_{}_{}'.format(*l_i)
         updated_links[l['uid']] = {'old_id': old_l_id, 'new_id': l['id']}
+        index_uid(link_uids, g_id, l['uid'], l['id'])
     #  Delete the old link docs, and insert new ones with topologically appropriate ids.
     auto_reql(r.db(db_id(g_id)).table('links').get_all(*links_to_update).delete(), c)
     auto_reql(r.db(db_id(g_id)).table('links').insert(old_ld), c)
@@ -2478,6 +2770,8 @@ def remove_node_type(g_id, n_type, c=None):
     except r.ReqlNonExistenceError:
         return {'error': errors['Nonexistence']['node_type'](g_id, n_type)}
     info = auto_reql(r.db(db_id(g_id)).table('nodes').filter({'type': n_type}).update({'type': 'Node'}), c)
+    stale_fields(g_id, 'nodes')
+    forget_commits(g_id, 'nodes')
     return {'node_types_deleted': 1, 'nodes_updated': info['replaced']}
 
 
@@ -2486,11 +2780,14 @@ def remove_link_type(g_id, l_type, c=None):
         c = r.connect()
     if l_type == "Link":
         return {'error': errors['Protected']['link_type'](g_id, l_type)}
+    forget_link_types(g_id)
     try:
         auto_reql(r.db(db_id(g_id)).table('link_types').get(l_type).delete(), c)
     except r.ReqlNonExistenceError:
         return {'error': errors['Nonexistence']['node_type'](g_id, l_type)}
     info = auto_reql(r.db(db_id(g_id)).table('links').filter({'type': l_type}).update({'type': 'Link'}), c)
+    stale_fields(g_id, 'links')
+    forget_commits(g_id, 'links')
     return {'link_types_deleted': 1, 'links_updated': info['replaced']}
 
 
@@ -2590,6 +2887,7 @@ walkers = {
 
 api_queries = {
     'insert': insert,
+    'bulk_load': bulk_load,
     'create_graph': create_graph,
     'drop_graph': drop_graph,
     'pluck': pluck,
@@ -2602,6 +2900,7 @@ api_queries = {
     'graph_filter': graph_filter,
     'walk': walk,
     'fields': fields,
+    'cache_fields': cache_fields,
     'create_index': create_index,
     'graph_stats': graph_stats
 }
@@ -79,6 +79,17 @@ def graphNonexistence(offending_value):
     return {'type': err_type, 'msg': error_format(err_type, query, offending_value, expl)}
 
 
+def graphUnavailable(g_id, state):
+    query = "SynthDB.graph('{}')...".format(g_id)
+    if state['state'] == 'failed':
+        expl = "Graph('{}') failed to load: {}".format(g_id, state.get('error'))
+    else:
+        expl = "Graph('{}') is still loading ({} of {} Links). Try again shortly.".format(
+            g_id, state.get('links_loaded', 0), state.get('num_links', 0))
+    err_type = "GraphUnavailableError"
+    return {'type': err_type, 'msg': error_format(err_type, query, g_id, expl)}
+
+
 def graphIDInUse(g_id):
     query = "SynthDB.create_graph('{}')...".format(g_id)
     expl = "Graph('{}') already exists. You must use a unique name for a new Graph.".format(g_id)
@@ -211,6 +222,27 @@ def uid_required(g_id, doc_type, doc_id, oper, query_params=None):
     return {'type': err_type, 'msg': error_format(err_type, query, wrong_val, expl)}
 
 
+def bad_bulk_load(g_id, fmt, reason):
+    query = "SynthDB.graph('{}').bulk_load(..., format='{}')".format(g_id, fmt)
+    expl = "The {} payload could not be loaded: {}".format(fmt, reason)
+    err_type = "InvalidOperationError"
+    return {'type': err_type, 'msg': error_format(err_type, query, fmt, expl)}
+
+
+def binary_export_error(g_id, doc_type, doc_id, value_type):
+    query = "SynthDB.graph('{}').{}('{}').coerce_to('binary')".format(g_id, doc_type, doc_id)
+    expl = "{}('{}') contains {} values, which have no binary representation.".format(doc_type, doc_id, value_type)
+    err_type = "ValueTypeError"
+    return {'type': err_type, 'msg': error_format(err_type, query, doc_id, expl)}
+
+
+def graph_too_large(g_id, reason):
+    query = "SynthDB.graph('{}').generate(...)".format(g_id)
+    expl = "graph('{}') cannot be stored: {}".format(g_id, reason)
+    err_type = "LimitsExceededError"
+    return {'type': err_type, 'msg': error_format(err_type, query, g_id, expl)}
+
+
 def limits_exceeded(g_id, doc_type, limit):
     query = "SynthDB.graph('{}').insert_{}s(...)".format(g_id, doc_type)
     expl = "graph('{}') has already met it's limit of {} {}s".format(g_id, limit, doc_type)
@@ -281,9 +313,16 @@ class LimitsExceededError(Exception):
         print msg
 
 
+class GraphUnavailableError(Exception):
+    def __init__(self, msg):
+        self.msg = msg
+        print msg
+
+
 errors = {
     'RethinkDBNonexistence': rethinkDBNonexistence,
     'Nonexistence': nonexistence,
+    'Unavailable': {'graph': graphUnavailable},
     'Protected': protected,
     'IDDuplicates': {
         'graph': graphIDInUse,
@@ -298,7 +337,10 @@ errors = {
         'topo': needs_topo
     },
     'property_map_sort': pm_sort_error,
-    'limits': limits_exceeded
+    'limits': limits_exceeded,
+    'bulk_load': bad_bulk_load,
+    'binary_export': binary_export_error,
+    'graph_size': graph_too_large
 }
 
 error_classes = {
@@ -308,5 +350,6 @@ error_classes = {
     'DuplicateIDError': DuplicateIDError,
     'TopologyError': TopologyError,
     'ValueTypeError': ValueTypeError,
-    'LimitsExceededError': LimitsExceededError
+    'LimitsExceededError': LimitsExceededError,
+    'GraphUnavailableError': GraphUnavailableError
 }
\ No newline at end of file
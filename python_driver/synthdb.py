@@ -30,6 +30,21 @@ from os.path import join
 from copy import deepcopy as copy
 import time
 import csv
+import itertools
+from io import BytesIO
+try:
+    import numpy
+except ImportError:
+    numpy = None
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+import struct
 
 rep = {'\n': '%0A', '\t': '%09', '\r': '%0D', '\b': '%08', '\\': '%5C', '\"': '%22', '\x00': '%00',
        '\x01': '%01', '\x02': '%02', '\x03': '%03', '\x04': '%04', '\x05': '%05', '\x06': '%06', '\x07': '%07',
@@ -153,7 +168,9 @@ def connect(host="http://127.0.0.1:7796/", key_file=None, verify=False):
     try:
         r = requests.get(urljoin(host, 'preql/q'), verify=verify, headers={'Api-Key': key, 'q': 'ping'})
         if r.text == "Hi there!":
-            return Connection(host, key, verify)
+            server_formats = [fmt.strip() for fmt in r.headers.get('Wire-Formats', 'json').split(',')]
+            wire_format = 'msgpack' if msgpack is not None and 'msgpack' in server_formats else 'json'
+            return Connection(host, key, verify, wire_format)
         else:
             raise PreqlDriverError(*error_params)
     except requests.ConnectionError:
@@ -212,9 +229,10 @@ class create_graph(Runnable):
 
 
 class list_graphs(Runnable):
-    def __init__(self):
+    def __init__(self, states=False):
         Runnable.__init__(self)
         self.q = "list_graphs"
+        self.params['states'] = states
 
 
 class drop_graph(Runnable):
@@ -225,7 +243,7 @@ class drop_graph(Runnable):
 
 
 class Connection(object):
-    def __init__(self, host="http://127.0.0.1:7796/", key=None, verify=False):
+    def __init__(self, host="http://127.0.0.1:7796/", key=None, verify=False, wire_format='json'):
         self.host = host
         self.api = urljoin(host, 'preql/q')
         self.update = urljoin(host, 'preql/update')
@@ -233,6 +251,7 @@ class Connection(object):
         self.key = key
         self.verify = verify
         self.delim = '\t'
+        self.wire_format = wire_format
 
     @staticmethod
     def __str_quote(string):
@@ -296,7 +315,73 @@ class Connection(object):
                 yield json.dumps(obj)+self.delim
 
     @staticmethod
-    def __handle_response(r):
+    def __stream_frames(iterable, verbose=False):
+        for i, obj in enumerate(iterable):
+            packed = msgpack.packb(obj, use_bin_type=True)
+            yield struct.pack('>I', len(packed)) + packed
+            if verbose:
+                stdout.write("\r{} transmitted".format(i+1))
+                stdout.flush()
+        if verbose:
+            stdout.write('\n')
+            stdout.flush()
+
+    @staticmethod
+    def __read_frames(r):
+        buf = ''
+        for chunk in r.iter_content(chunk_size=1 << 16):
+            buf += chunk
+            pos = 0
+            while len(buf) - pos >= 4:
+                size = struct.unpack_from('>I', buf, pos)[0]
+                if len(buf) - pos - 4 < size:
+                    break
+                yield msgpack.unpackb(buf[pos + 4:pos + 4 + size], raw=False)
+                pos += 4 + size
+            buf = buf[pos:]
+
+    @staticmethod
+    def __columnar(data, params):
+        fmt = params['format']
+        if type(data).__name__ in ['str', 'unicode']:
+            if fmt != 'npy':
+                return open(data, 'rb')
+            if numpy is None:
+                raise PreqlDriverError("bulk_load(..., format='npy')", "numpy is required for npy payloads.", 'npy')
+            data = numpy.load(data)
+        buf = BytesIO()
+        if fmt == 'npy':
+            if numpy is None:
+                raise PreqlDriverError("bulk_load(..., format='npy')", "numpy is required for npy payloads.", 'npy')
+            params['columns'] = list(data)
+            for name in params['columns']:
+                numpy.lib.format.write_array(buf, numpy.asarray(data[name]), allow_pickle=False)
+        elif fmt == 'arrow':
+            if pyarrow is None:
+                raise PreqlDriverError("bulk_load(..., format='arrow')", "pyarrow is required for arrow payloads.", 'arrow')
+            table = pyarrow.Table.from_arrays([pyarrow.array(data[k]) for k in data], names=list(data))
+            writer = pyarrow.RecordBatchStreamWriter(buf, table.schema)
+            writer.write_table(table)
+            writer.close()
+        elif fmt == 'csv':
+            writer = csv.writer(buf, delimiter=str(params.get('delimiter', ',')))
+            writer.writerow(list(data))
+            writer.writerows(itertools.izip(*[data[k] for k in data]))
+        return buf.getvalue()
+
+    @staticmethod
+    def __read_npy(content):
+        if numpy is None:
+            raise PreqlDriverError("coerce_to('binary')", "numpy is required for binary payloads.", 'binary')
+        f = BytesIO(content)
+        values = numpy.load(f, allow_pickle=False)
+        if f.tell() < len(content):
+            return numpy.load(f, allow_pickle=False), values
+        return values
+
+    def __handle_response(self, r):
+        if r.headers.get('Content-Type') == 'application/octet-stream':
+            return self.__read_npy(r.content)
         try:
             d = r.json()
             if type(d).__name__ == 'dict' and 'error' in d:
@@ -305,11 +390,19 @@ class Connection(object):
             d = r.text
         return d
 
-    @staticmethod
-    def __validate_stream(r):
-        stream = r.iter_lines(delimiter='\t')
+    def __validate_stream(self, r):
+        if r.headers.get('Content-Type') == 'application/x-msgpack':
+            stream = self.__read_frames(r)
+            try:
+                d = next(stream)
+            except StopIteration:
+                return None, None
+            if type(d).__name__ == 'dict' and 'error' in d:
+                raise preqlerrors.error_classes[d['error']['type']](d['error']['msg'])
+            return d, stream
+        stream = (json.loads(line) for line in r.iter_lines(delimiter='\t') if line)
         try:
-            d = json.loads(next(stream))
+            d = next(stream)
         except StopIteration:
             return None, None
         if type(d).__name__ == 'dict' and 'error' in d:
@@ -321,8 +414,7 @@ class Connection(object):
     def __stream_response(first, stream):
         yield first
         for d in stream:
-            if d:
-                yield json.loads(d)
+            yield d
 
     def __get_catch(self, url, stream=False):
         try:
@@ -362,16 +454,26 @@ class Connection(object):
         headers = {
             'Api-Key': self.key,
             'g': query_obj.g,
-            'q': q
+            'q': q,
+            'Wire-Format': self.wire_format
         }
         r = None
         if q == "insert":
             headers['params'] = json.dumps(query_obj.params)
-            r = self.__post_catch(self.api, data=self.__stream_json(query_obj.body, verbose), headers=headers)
+            if self.wire_format == 'msgpack':
+                body = self.__stream_frames(query_obj.body, verbose)
+            else:
+                body = self.__stream_json(query_obj.body, verbose)
+            r = self.__post_catch(self.api, data=body, headers=headers)
+        elif q == "bulk_load":
+            body = self.__columnar(query_obj.body, query_obj.params)
+            headers['params'] = json.dumps(query_obj.params)
+            r = self.__post_catch(self.api, data=body, headers=headers)
         elif q in ["create_graph", "drop_graph", "list_graphs", "graph_stats"]:
+            headers['params'] = json.dumps(query_obj.params)
             r = self.__post_catch(self.api, headers=headers, data=None)
         elif q in ["pluck", "stream", "update", "topology", "generate", "commit", "graph_filter", "delete",
-                   "create_index", "walk", "fields"]:
+                   "create_index", "walk", "fields", "cache_fields"]:
             headers['params'] = json.dumps(query_obj.params)
             r = self.__prepped_put_catch(
                 self.api, data=pickledumps(query_obj.body), headers=headers, stream=query_obj.stream)
@@ -450,6 +552,8 @@ class PreqlQuery(Runnable):
                 nq.body['pmap_name'] = kwargs['name']
             if 'type' in kwargs:
                 nq.body['pmap_type'] = kwargs['type']
+        elif data_type == "binary" and kwargs.get('ids'):
+            nq.body['ids'] = True
         ps = preqlerrors.param_stringer(kwargs)
         if ps == "...":
             nq.query_string += ".coerce_to('{}')".format(data_type)
@@ -507,7 +611,7 @@ class PreqlQuery(Runnable):
             nq.body['sort'] = kwargs
         else:
             nq.body['walk_rules']['sort'] = kwargs
-        if not ('coerce_to' in nq.body and nq.body['coerce_to'] == "array"):
+        if not ('coerce_to' in nq.body and nq.body['coerce_to'] in ["array", "binary"]):
             nq.stream = True
         nq.query_string += ".sort({})".format(preqlerrors.param_stringer(kwargs))
         return nq
@@ -520,12 +624,28 @@ class PreqlQuery(Runnable):
         nq.query_string += ".limit({})".format(number)
         return nq
 
-    def commit(self, fields):
+    def skip(self, number):
+        nq = copy(self)
+        nq.body['skip'] = number
+        nq.query_string += ".skip({})".format(number)
+        return nq
+
+    def value_range(self, min=None, max=None):
+        nq = copy(self)
+        nq.body['value_range'] = {'min': min, 'max': max}
+        nq.query_string += ".value_range(min={}, max={})".format(min, max)
+        return nq
+
+    def commit(self, fields, incremental=False):
         nq = copy(self)
         nq.q = "commit"
         nq.stream = False
         nq.body['commit_target'] = fields
-        nq.query_string += ".commit({})".format(fields)
+        if incremental:
+            nq.body['incremental'] = True
+            nq.query_string += ".commit({}, incremental=True)".format(fields)
+        else:
+            nq.query_string += ".commit({})".format(fields)
         return nq
 
     def count(self):
@@ -591,6 +711,27 @@ class PreqlQuery(Runnable):
         nq.query_string += ".all_fields()"
         return nq
 
+    def cache_fields(self, *fields, **kwargs):
+        nq = copy(self)
+        nq.q = "cache_fields"
+        nq.stream = False
+        nq.body['fields'] = list(fields)
+        nq.body['drop'] = kwargs.get('drop', False)
+        nq.query_string += ".cache_fields({})".format(', '.join(preqlerrors.quoted_val(f) for f in fields))
+        return nq
+
+    def bulk_load(self, data, format='npy', **kwargs):
+        nq = copy(self)
+        nq.q = "bulk_load"
+        nq.stream = False
+        nq.body = data
+        nq.params['format'] = format
+        for k in ['conflict', 'durability', 'batch_size', 'return_failures', 'delimiter']:
+            if k in kwargs:
+                nq.params[k] = kwargs[k]
+        nq.query_string += ".bulk_load(..., format='{}')".format(format)
+        return nq
+
     def create_index(self, index_name, definition=None):
         nq = copy(self)
         nq.q = "create_index"
@@ -636,6 +777,9 @@ def make_insert_func(cls, iq):
             nq.params['conflict'] = kwargs['conflict']
         if 'durability' in kwargs:
             nq.params['durability'] = kwargs['durability']
+        for k in ['batch_size', 'pipeline_depth', 'adaptive']:
+            if k in kwargs:
+                nq.params[k] = kwargs[k]
         if len(kwargs) > 0:
             nq.query_string += ".insert_{}({}, {})".format(iq, nq.body, preqlerrors.param_stringer(kwargs))
         else:
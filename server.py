@@ -28,17 +28,38 @@ import itertools
 import numpy
 import dill as pickle
 import operator
-from urllib2 import unquote
+from urllib2 import unquote, quote
 import synthdb
 import preqlerrors
 import math
 import sys
+import threading
+import time
+from cherrypy.process.plugins import Monitor
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict, MutableMapping
+#  Not used here, but the pickled query functions resolve their globals against this module
+from collections import deque
+import shutil
+import csv
+import struct
+from io import BytesIO
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
 
 # Utilities
 
 primary_id_check = re.compile("^(?!\D)\d*_\d*_\d*$|^(?!\D)\d*$")
 
 literal_check = re.compile("^##r.literal\((?P<json_doc>.+?)\)##$", re.U)
+#  A map given as a bare name reads that field; JavaScript mappers always arrive wrapped in parentheses
+field_name_check = re.compile("^\w+$", re.U)
 
 path = os.path.dirname(os.path.abspath(__file__))
 
@@ -46,11 +67,69 @@ graphs = {}
 property_maps = {}
 ndarrays = {}
 subgraphs = {}
+graph_states = {}
+node_uids = {}
+link_uids = {}
+uid_builds = {}
+uid_lock = threading.Lock()
+link_types_cache = {}
+link_indexes = {}
+topology_versions = {}
+map_versions = itertools.count(1)
+committed_maps = {}
+field_caches = {}
+sort_cache = OrderedDict()
+sort_cache_size = 32
+graph_access = OrderedDict()
+graph_pins = {}
+pins_lock = threading.Lock()
+load_locks = {}
+load_locks_lock = threading.Lock()
 
 errors = preqlerrors.errors
 
 free_limits = {'nodes': 1000, 'links': 10000}
 
+read_chunk_size = 1 << 20
+
+wire_formats = ['json'] + (['msgpack'] if msgpack is not None else [])
+msgpack_type = 'application/x-msgpack'
+binary_type = 'application/octet-stream'
+object_value_types = ('string', 'vector<string>', 'python::object')
+stream_chunk_size = 65536
+
+insert_workers = 8
+insert_target_latency = 0.5
+insert_batch_limits = (50, 10000)
+insert_pool = ThreadPoolExecutor(max_workers=insert_workers)
+worker_conns = threading.local()
+scan_workers = 8
+scan_sample_size = 4096
+scan_pool = ThreadPoolExecutor(max_workers=scan_workers)
+
+load_batch_size = 100000
+boot_workers = 4
+
+vertex_bytes = 64
+edge_bytes = 40
+
+#  Links are packed into one int64 as origin | ordinal | terminus
+link_vertex_bits = 26
+link_ordinal_bits = 11
+link_vertex_mask = (1 << link_vertex_bits) - 1
+link_ordinal_mask = (1 << link_ordinal_bits) - 1
+link_ordinal_limit = numpy.iinfo(numpy.int16).max
+
+snapshot_dir = os.path.join(path, 'snapshots')
+store_dir = os.path.join(path, 'property_maps')
+snapshot_interval = 600
+snapshot_lock = threading.RLock()
+snapshot_dirty = set()
+#  Links sampled from the database to confirm a snapshot and its journal still agree with it
+snapshot_check_size = 1000
+journals = {}
+pending_nodes = {}
+
 
 def check_key():
     return 'Api-Key' in cherrypy.request.headers and cherrypy.request.headers['Api-Key'] == key
@@ -100,44 +179,291 @@ def id_or_uid(o_id, obj_type):
     return obj_id, uid, id_quote
 
 
-def tab_separate(f, delim='\t'):
+def worker_conn():
+    if getattr(worker_conns, 'c', None) is None:
+        worker_conns.c = r.connect()
+    return worker_conns.c
+
+
+def write_batch(dbid, table, docs, **kwargs):
+    dt = time.time()
+    d = auto_reql(r.db(dbid).table(table).insert(docs, **kwargs), worker_conn())
+    return d, time.time() - dt
+
+
+def scan_ranges(g_id, table, parts=None):
+    #  Primary key ranges for between(); node ids are dense ints, link ids are split at sampled quantiles
+    parts = parts or scan_workers
+    g = graphs[g_id]
+    if table == 'nodes':
+        cuts = numpy.linspace(0, g.num_vertices(), parts + 1).astype(int)[1:-1].tolist()
+    elif table == 'links':
+        links = edge_table(g_id, g)
+        present = numpy.flatnonzero(links[:, 0] >= 0)
+        if len(present) == 0:
+            cuts = []
+        else:
+            sample = numpy.sort(link_strs(links[present[numpy.random.randint(0, len(present), scan_sample_size)]]))
+            cuts = sample[numpy.linspace(0, len(sample), parts + 1).astype(int)[1:-1]].tolist()
+    else:
+        cuts = []
+    bounds = [r.minval] + sorted(set(cuts)) + [r.maxval]
+    return zip(bounds[:-1], bounds[1:])
+
+
+def scan_range(dbid, table, lo, hi, build, handle):
+    return handle(auto_reql(build(r.db(dbid).table(table).between(lo, hi)), worker_conn()))
+
+
+def parallel_scan(g_id, table, build, handle, parts=None):
+    #  build turns a between() range into a query, and handle consumes its result on the worker's connection
+    futures = [scan_pool.submit(scan_range, db_id(g_id), table, lo, hi, build, handle)
+               for lo, hi in scan_ranges(g_id, table, parts)]
+    return [f.result() for f in futures]
+
+
+def update_batch(dbid, table, updates):
+    dt = time.time()
+    d = auto_reql(r.expr(updates).for_each(
+        lambda u: r.db(dbid).table(table).get(u['id']).update(u['update'])), worker_conn())
+    return d, time.time() - dt
+
+
+def tab_separate(f, delim='\t', chunk_size=None):
+    if chunk_size is None:
+        chunk_size = read_chunk_size
+    rest = ''
+    while True:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            break
+        records = (rest + chunk).split(delim)
+        rest = records.pop()
+        for rec in records:
+            if rec.strip():
+                yield rec
+    if rest.strip():
+        yield rest
+
+
+def wire_format():
+    fmt = cherrypy.request.headers.get('Wire-Format', 'json')
+    return fmt if fmt in wire_formats else 'json'
+
+
+def msgpack_default(obj):
+    if isinstance(obj, numpy.generic):
+        return obj.item()
+    if isinstance(obj, numpy.ndarray):
+        return obj.tolist()
+    if type(obj).__name__.startswith('Vector'):
+        return list(obj)
+    raise TypeError("Cannot serialize {} as msgpack.".format(type(obj).__name__))
+
+
+def frame(obj):
+    packed = msgpack.packb(obj, use_bin_type=True, default=msgpack_default)
+    return struct.pack('>I', len(packed)) + packed
+
+
+def read_frames(f, chunk_size=None):
+    if chunk_size is None:
+        chunk_size = read_chunk_size
     buf = ''
     while True:
-        c = unicode(f.read(1))
-        if c == '':
-            return
-        buf += c
-        if c == delim:
-            yield buf
-            buf = ''
+        chunk = f.read(chunk_size)
+        if not chunk:
+            break
+        buf += chunk
+        pos = 0
+        while len(buf) - pos >= 4:
+            size = struct.unpack_from('>I', buf, pos)[0]
+            if len(buf) - pos - 4 < size:
+                break
+            yield msgpack.unpackb(buf[pos + 4:pos + 4 + size], raw=False)
+            pos += 4 + size
+        buf = buf[pos:]
+    if buf:
+        raise ValueError("Truncated msgpack frame at the end of the request body.")
+
+
+def read_records(f, delim='\t'):
+    if wire_format() == 'msgpack':
+        return read_frames(f)
+    return (json.loads(rec) for rec in tab_separate(f, delim=delim))
 
 
 def db_id(g_id):
     return graphs[g_id].graph_properties['id']
 
 
+def find_node_uid(g_id, uid, c):
+    dbid = db_id(g_id)
+    if dbid in node_uids:
+        return node_uids[dbid].get(uid)
+    d = auto_reql(r.db(dbid).table('nodes').get_all(uid, index='uid')['id'].coerce_to('array'), c)
+    if len(d) > 0:
+        return int(d[0])
+    return None
+
+
+def find_link_uid(g_id, uid, c):
+    dbid = db_id(g_id)
+    if dbid in link_uids:
+        return link_uids[dbid].get(uid)
+    d = auto_reql(r.db(dbid).table('links').get_all(uid, index='uid')['id'].coerce_to('array'), c)
+    if len(d) > 0:
+        return d[0]
+    return None
+
+
+def index_uid(index, g_id, uid, obj_id):
+    dbid = db_id(g_id)
+    with uid_lock:
+        if dbid in uid_builds:
+            uid_builds[dbid].append((index, uid, obj_id))
+        if dbid in index:
+            if obj_id is None:
+                index[dbid].pop(uid, None)
+            else:
+                index[dbid][uid] = obj_id
+
+
+def load_uid_index(g_name, c):
+    #  Runs after the graph is ready; until the maps are installed uid lookups go to the uid secondary index,
+    #  and writes made during the scan are logged and replayed on top of it.
+    g = graphs.get(g_name)
+    uid_builds[g_name] = []
+    try:
+        built = {}
+        for table, index in [('nodes', node_uids), ('links', link_uids)]:
+            qu = r.db(g_name).table(table).has_fields('uid').map(lambda doc: [doc['uid'], doc['id']])
+            built[id(index)] = dict(auto_reql(qu, c, max_batch_rows=load_batch_size))
+        with uid_lock:
+            for index, uid, obj_id in uid_builds[g_name]:
+                if obj_id is None:
+                    built[id(index)].pop(uid, None)
+                else:
+                    built[id(index)][uid] = obj_id
+            if graphs.get(g_name) is g:
+                node_uids[g_name] = built[id(node_uids)]
+                link_uids[g_name] = built[id(link_uids)]
+    except Exception, err:
+        print "!!!!Graph('{0}') uid index failed to build: {1}".format(g_name, err)
+    finally:
+        with uid_lock:
+            del uid_builds[g_name]
+
+
+def get_link_type(g_id, lt_id, c):
+    dbid = db_id(g_id)
+    if dbid not in link_types_cache:
+        types = auto_reql(r.db(dbid).table('link_types').coerce_to('array'), c)
+        link_types_cache.setdefault(dbid, {'types': {lt['id']: lt for lt in types}, 'dirty': set(),
+                                           'lock': threading.Lock()})
+    cache = link_types_cache[dbid]
+    if lt_id not in cache['types']:
+        lt = graph_format['link_types'](g_id, {'id': lt_id})
+        auto_reql(r.db(dbid).table('link_types').insert(lt, conflict='update'), c)
+        cache['types'].setdefault(lt_id, lt)
+    return cache['types'][lt_id]
+
+
+def widen_link_type(g_id, lt, value):
+    cache = link_types_cache[db_id(g_id)]
+    with cache['lock']:
+        if value < lt['min']:
+            lt['min'] = value
+        elif value > lt['max']:
+            lt['max'] = value
+        else:
+            return
+        cache['dirty'].add(lt['id'])
+
+
+def flush_link_types(g_id, c):
+    dbid = db_id(g_id)
+    if dbid not in link_types_cache:
+        return
+    cache = link_types_cache[dbid]
+    #  Ranges are copied out and the dirty set cleared in one step, so a type widened mid-flush is flushed next time
+    with cache['lock']:
+        ranges = [(lt_id, cache['types'][lt_id]['min'], cache['types'][lt_id]['max']) for lt_id in cache['dirty']]
+        cache['dirty'].clear()
+    for lt_id, lo, hi in ranges:
+        auto_reql(r.db(dbid).table('link_types').get(lt_id).update(lambda doc: {
+            'min': r.expr([doc['min'], lo]).min(),
+            'max': r.expr([doc['max'], hi]).max()
+        }), c)
+
+
+def forget_link_types(g_id):
+    link_types_cache.pop(db_id(g_id), None)
+
+
 def get_vertex_id(g_id, n_id, c):
     if primary_id_check.match(unicode(n_id)):
         return int(n_id)
     else:
-        prim_id = trim_id(n_id)
-        d = auto_reql(r.db(db_id(g_id)).table('nodes').get_all(prim_id, index='uid').coerce_to('array'), c)
-        if len(d) > 0:
-            return int(d[0]['id'])
-        return None
+        return find_node_uid(g_id, trim_id(n_id), c)
+
+
+def check_link_ordinals(links):
+    #  Ordinals are stored in an int16_t edge property
+    if len(links) > 0 and links[:, 1].max() > link_ordinal_limit:
+        raise ValueError("No more than {} parallel links are allowed between two nodes.".format(link_ordinal_limit + 1))
+
+
+def pack_link(o, eid, t):
+    #  Ids too wide for their field keep the plain (o, eid, t) tuple as a key, and -1 in packed arrays
+    if 0 <= o <= link_vertex_mask and 0 <= t <= link_vertex_mask and 0 <= eid <= link_ordinal_mask:
+        return (o << (link_ordinal_bits + link_vertex_bits)) | (eid << link_vertex_bits) | t
+    return o, eid, t
+
+
+def unpack_link(key):
+    if isinstance(key, tuple):
+        return key
+    return key >> (link_ordinal_bits + link_vertex_bits), (key >> link_vertex_bits) & link_ordinal_mask, \
+        key & link_vertex_mask
+
+
+def pack_links(links):
+    links = numpy.asarray(links, dtype=numpy.int64).reshape(-1, 3)
+    keys = (links[:, 0] << (link_ordinal_bits + link_vertex_bits)) | (links[:, 1] << link_vertex_bits) | links[:, 2]
+    fits = (links.min(axis=1) >= 0) & (numpy.maximum(links[:, 0], links[:, 2]) <= link_vertex_mask) & \
+        (links[:, 1] <= link_ordinal_mask)
+    return numpy.where(fits, keys, -1)
+
+
+def unpack_links(keys):
+    keys = numpy.asarray(keys, dtype=numpy.int64)
+    return numpy.column_stack([keys >> (link_ordinal_bits + link_vertex_bits),
+                               (keys >> link_vertex_bits) & link_ordinal_mask, keys & link_vertex_mask])
+
+
+def link_str(key):
+    return '{}_{}_{}'.format(*unpack_link(key))
+
+
+def parse_link(l_id):
+    return pack_link(*[int(v) for v in l_id.split('_')])
+
+
+def edge_key(g, e):
+    if 'key' in g.edge_properties and g.edge_properties['key'][e] >= 0:
+        return int(g.edge_properties['key'][e])
+    return pack_link(int(e.source()), int(g.edge_properties['id'][e]), int(e.target()))
 
 
 def get_edge_id(g_id, e, c):
     if type(e).__name__ == "Edge":
-        return "{}_{}_{}".format(int(e.source()), graphs[g_id].edge_properties['id'][e], int(e.target()))
+        return link_str(edge_key(graphs[g_id], e))
     prim_id = trim_id(e)
     if primary_id_check.match(unicode(prim_id)):
         return prim_id
     else:
-        d = auto_reql(r.db(db_id(g_id)).table('links').get_all(prim_id, index='uid').coerce_to('array'), c)
-        if len(d) > 0:
-            return d[0]['id']
-        return None
+        return find_link_uid(g_id, prim_id, c)
 
 
 def get_field_list(d):
@@ -164,13 +490,120 @@ def update_formatter(fp, value):
 
 
 def get_edge(g, o, t, eid):
+    index = link_index(g)
+    if index is not None:
+        return index.edge(int(o), int(eid), int(t))
     es = g.edge(o, t, all_edges=True)
     for e in es:
         if g.edge_properties['id'][e] == int(eid):
             return e
 
 
-def stream_gen(iterable, event_stream, coerce_to='stream', count=False):
+class RowBlock(object):
+    #  A chunk of [id, value] rows, encoded in one pass instead of one json.dumps per row.
+    #  plain means no id can contain the row separator, so rows may be split out of a single dump.
+    def __init__(self, ids, values, plain=True):
+        self.ids = ids
+        self.values = values
+        self.plain = plain
+
+    def __len__(self):
+        return len(self.values)
+
+    def rows(self):
+        ids = self.ids.tolist() if isinstance(self.ids, numpy.ndarray) else self.ids
+        return zip(ids, self.values.tolist())
+
+    def encode(self, prefix, delimiter):
+        rows = self.rows()
+        if not rows:
+            return ''
+        if self.plain:
+            return prefix + json.dumps(rows)[1:-1].replace('], [', ']' + delimiter + prefix + '[') + delimiter
+        return ''.join([prefix + json.dumps(row) + delimiter for row in rows])
+
+    def frames(self):
+        return ''.join([frame(row) for row in self.rows()])
+
+
+def unblock(iterable):
+    for item in iterable:
+        if isinstance(item, RowBlock):
+            for row in item.rows():
+                yield row
+        else:
+            yield item
+
+
+def chunked(iterable, size=None):
+    it = iter(iterable)
+    size = size or stream_chunk_size
+    while True:
+        chunk = list(itertools.islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def block_values(g, pm, width=None):
+    #  Values as an array indexed by vertex or edge index, or None where rows must go through pm[key]
+    if pm.value_type() in object_value_types:
+        return None
+    values = map_values(g, pm, width)
+    if values is None:
+        return None
+    if 'bool' in pm.value_type():
+        return values.astype(bool)
+    if values.dtype == numpy.longdouble:
+        return values.astype(numpy.float64)
+    return values
+
+
+def link_strs(links):
+    if len(links) == 0:
+        return numpy.array([], dtype=str)
+    cols = [numpy.asarray(links)[:, i].astype(str) for i in range(3)]
+    return numpy.char.add(numpy.char.add(numpy.char.add(numpy.char.add(cols[0], '_'), cols[1]), '_'), cols[2])
+
+
+def npy_stream(arr):
+    #  .npy framing around the array's own buffer, sent in slices rather than copied whole
+    arr = numpy.ascontiguousarray(arr)
+    header = BytesIO()
+    numpy.lib.format.write_array_header_1_0(header, numpy.lib.format.header_data_from_array_1_0(arr))
+    yield header.getvalue()
+    flat = arr.reshape(-1)
+    step = stream_chunk_size * 16
+    for start in xrange(0, len(flat), step):
+        yield flat[start:start + step].tobytes()
+
+
+def binary_gen(iterable, ids=False):
+    cherrypy.response.headers['Content-Type'] = binary_type
+    if isinstance(iterable, numpy.ndarray):
+        return npy_stream(iterable)
+    blocks = list(iterable)
+    if blocks and not isinstance(blocks[0], RowBlock):
+        cherrypy.response.headers['Content-Type'] = 'text/plain'
+        return json.dumps(blocks[0])
+    if not blocks:
+        values = numpy.array([])
+    elif len(blocks) == 1:
+        values = blocks[0].values
+    else:
+        values = numpy.concatenate([block.values for block in blocks])
+    if not ids:
+        return npy_stream(values)
+    if not blocks:
+        id_col = numpy.array([], dtype=numpy.int64)
+    elif all(isinstance(block.ids, numpy.ndarray) for block in blocks):
+        id_col = numpy.concatenate([block.ids for block in blocks])
+    else:
+        id_col = numpy.array([i for block in blocks for i in block.ids])
+    return itertools.chain(npy_stream(values), npy_stream(id_col))
+
+
+def stream_gen(iterable, event_stream, coerce_to='stream', count=False, ids=False):
     if event_stream:
         delimiter = '\n\n'
         prefix = 'data: '
@@ -178,20 +611,29 @@ def stream_gen(iterable, event_stream, coerce_to='stream', count=False):
         delimiter = "\t"
         prefix = ''
     if count:
-        return json.dumps(sum(1 for _ in iterable))
+        return json.dumps(sum(len(item) if isinstance(item, RowBlock) else 1 for item in iterable))
+    if coerce_to == 'binary':
+        return binary_gen(iterable, ids)
+    #  Only streams are framed; single replies stay JSON, which every driver's non-stream path expects
+    if hasattr(iterable, '__iter__') and not event_stream and coerce_to == 'stream' and wire_format() == 'msgpack':
+        cherrypy.response.headers['Content-Type'] = msgpack_type
+        return (item.frames() if isinstance(item, RowBlock) else frame(item) for item in iterable)
     if hasattr(iterable, '__iter__'):
         if coerce_to == 'stream':
             cherrypy.response.headers['Content-Type'] = 'text/event-stream'
 
             def stream_it():
                 for item in iterable:
+                    if isinstance(item, RowBlock):
+                        yield item.encode(prefix, delimiter)
+                        continue
                     yield prefix + json.dumps(item) + delimiter
                 if event_stream:
                     yield '\nevent: usercloseconnection\ndata: ' + json.dumps("terminate connection") + delimiter
             return stream_it()
         elif coerce_to == "array":
             cherrypy.response.headers['Content-Type'] = 'text/plain'
-            return json.dumps(list(iterable))
+            return json.dumps(list(unblock(iterable)))
     else:
         return json.dumps(iterable)
 
@@ -235,33 +677,1062 @@ def create_graph(g_name=None, durability='hard', c=None):
     auto_reql(r.db(g_name).table('node_types').insert(graph_format['node_types']()), c)
     auto_reql(r.db(g_name).table('link_types').insert(graph_format['link_types']()), c)
     g.edge_properties['id'] = g.new_edge_property('int16_t')
+    g.edge_properties['key'] = g.new_edge_property('int64_t')
     graphs[g_name] = g
+    node_uids[g_name] = {}
+    link_uids[g_name] = {}
     return {'id': g_name, 'message': "Graph('{}') has been created.".format(g_name)}
 
 
-def load_graph(g_name, c=None):
-    if c is None:
-        c = r.connect()
+def blank_graph(g_name):
     g = gt.Graph()
     g.graph_properties['id'] = g.new_graph_property('string')
     g.graph_properties['id'] = g_name
     g.edge_properties['id'] = g.new_edge_property('int16_t')
+    g.edge_properties['key'] = g.new_edge_property('int64_t')
+    return g
+
+
+def load_graph(g_name, c=None, progress=None):
+    if c is None:
+        c = r.connect()
+    if progress is None:
+        progress = {}
     dt = datetime.now()
     print "\nProcessing Graph('{}')".format(g_name)
+    g = load_snapshot(g_name, c, progress)
+    if g is not None:
+        progress['links_loaded'] = g.num_edges()
+        print ">>>>Graph('{0}') Loaded from snapshot in {1}".format(g_name, datetime.now()-dt)
+        return g
+    g = blank_graph(g_name)
     print "    Loading in Nodes..."
     num_nodes = auto_reql(r.db(g_name).table('nodes').count(), c)
+    progress['num_nodes'] = num_nodes
     print "    %d Nodes Identified. Populating model..." % num_nodes
     g.add_vertex(n=num_nodes)
     print "    Done."
     print "    Loading in Links..."
-    for [o, l_id, t] in auto_reql(r.db(g_name).table('links').map(lambda link: link['id'].split('_')), c):
-        e = g.add_edge(o, t)
-        g.edge_properties['id'][e] = l_id
+    progress['num_links'] = auto_reql(r.db(g_name).table('links').count(), c)
+    cursor = auto_reql(r.db(g_name).table('links')['id'], c, max_batch_rows=load_batch_size)
+    chunks = []
+    while True:
+        l_ids = list(itertools.islice(cursor, load_batch_size))
+        if len(l_ids) == 0:
+            break
+        chunks.append(parse_link_ids(l_ids))
+        progress['links_loaded'] = progress.get('links_loaded', 0) + len(l_ids)
+    if len(chunks) > 0:
+        add_link_array(g, numpy.concatenate(chunks))
     print "    Done.  %d Links Identified." % g.num_edges()
     print ">>>>Graph('{0}') Loaded in {1}".format(g_name, datetime.now()-dt)
     return g
 
 
+def boot_graph(g_name):
+    state = graph_states[g_name]
+    try:
+        c = r.connect()
+        g = load_graph(g_name, c, state)
+        graphs[g_name] = g
+        #  A snapshot that loaded clean is already current; it is only rewritten once it has a journal to fold in
+        if state.get('replayed', 1) > 0:
+            save_snapshot(g_name)
+        state['state'] = 'ready'
+        threading.Thread(target=load_uid_index, args=(g_name, c)).start()
+    except Exception, err:
+        print "!!!!Graph('{0}') failed to load: {1}".format(g_name, err)
+        state['state'] = 'failed'
+        state['error'] = unicode(err)
+
+
+# Topology Snapshots
+
+def snapshot_paths(g_name):
+    base = os.path.join(snapshot_dir, g_name)
+    return base + '.links.npy', base + '.meta', base + '.journal'
+
+
+def is_base_graph(g_id):
+    g = graphs.get(g_id)
+    return type(g).__name__ == "Graph" and 'id' in g.graph_properties and g.graph_properties['id'] == g_id
+
+
+def link_array(g, edges=None):
+    if edges is None:
+        edges = g.get_edges()
+    links = numpy.empty((len(edges), 3), dtype=numpy.int64)
+    links[:, 0] = edges[:, 0]
+    links[:, 1] = g.edge_properties['id'].a[edges[:, 2]]
+    links[:, 2] = edges[:, 1]
+    return links
+
+
+def parse_link_ids(l_ids):
+    return numpy.fromstring(str('_'.join(l_ids)), dtype=numpy.int64, sep='_').reshape(-1, 3)
+
+
+def add_link_array(g, links):
+    if len(links) == 0:
+        return
+    edges = numpy.column_stack([links[:, 0], links[:, 2], links[:, 1], pack_links(links)])
+    g.add_edge_list(edges, eprops=[g.edge_properties['id'], g.edge_properties['key']])
+
+
+def set_link_key(g, e):
+    key = pack_link(int(e.source()), int(g.edge_properties['id'][e]), int(e.target()))
+    g.edge_properties['key'][e] = -1 if isinstance(key, tuple) else key
+
+
+# Link Index
+
+
+class LinkIndex(object):
+    #  Packed keys are kept sorted next to their edge indices, so single keys and whole batches resolve by searchsorted
+    def __init__(self, g):
+        self.g = g
+        self.rebuild()
+
+    def rebuild(self):
+        edges = self.g.get_edges()
+        links = link_array(self.g, edges)
+        self.links = numpy.full((self.g.edge_index_range, 3), -1, dtype=numpy.int64)
+        self.links[edges[:, 2]] = links
+        keys = pack_links(links)
+        order = numpy.argsort(keys)
+        self.sorted = (keys[order], edges[:, 2].astype(numpy.int64)[order])
+        #  Links with ids too wide to pack can only be found through their parallel edges
+        self.fits = bool((keys >= 0).all())
+        self.stale = False
+
+    def sorted_keys(self):
+        if self.stale:
+            self.rebuild()
+        return self.sorted
+
+    def find(self, o, eid, t):
+        return self.find_key(pack_link(o, eid, t))
+
+    def find_key(self, key):
+        if isinstance(key, tuple):
+            return None
+        keys, present = self.sorted_keys()
+        pos = numpy.searchsorted(keys, key)
+        if pos < len(keys) and keys[pos] == key:
+            return int(present[pos])
+        return None
+
+    def edge(self, o, eid, t):
+        return self.edge_by_key(pack_link(o, eid, t))
+
+    def edge_by_key(self, key):
+        #  Only the parallel links of the pair are walked to find the descriptor
+        i = self.find_key(key)
+        if i is None:
+            return None
+        o, eid, t = self.links[i].tolist()
+        for e in self.g.edge(o, t, all_edges=True):
+            if self.g.edge_index[e] == i:
+                return e
+        return None
+
+    def __insert(self, keys, indices):
+        order = numpy.argsort(keys)
+        old_keys, present = self.sorted
+        pos = numpy.searchsorted(old_keys, keys[order])
+        self.sorted = (numpy.insert(old_keys, pos, keys[order]), numpy.insert(present, pos, indices[order]))
+
+    def __drop(self, keys):
+        old_keys, present = self.sorted
+        if len(old_keys) == 0:
+            return numpy.array([], dtype=numpy.int64), numpy.zeros(len(keys), dtype=bool)
+        pos = numpy.minimum(numpy.searchsorted(old_keys, keys), len(old_keys) - 1)
+        found = (old_keys[pos] == keys) & (keys >= 0)
+        indices = present[pos[found]]
+        self.sorted = (numpy.delete(old_keys, pos[found]), numpy.delete(present, pos[found]))
+        return indices, found
+
+    def add(self, links, contiguous):
+        #  New edges only take the next indexes when there are no holes left by removals to reuse
+        if self.stale or not contiguous:
+            self.stale = True
+            return
+        start = len(self.links)
+        self.links = numpy.concatenate([self.links, links])
+        keys = pack_links(links)
+        self.fits = self.fits and bool((keys >= 0).all())
+        self.__insert(keys, numpy.arange(start, len(self.links), dtype=numpy.int64))
+
+    def remove(self, o, eid, t):
+        if self.stale:
+            return
+        indices, found = self.__drop(pack_links([[o, eid, t]]))
+        self.links[indices] = -1
+
+    def relabel(self, links, new_eids):
+        #  Every old key goes before any new one is added, since a renumbering can reuse an ordinal it also frees
+        if self.stale:
+            return
+        links = numpy.asarray(links, dtype=numpy.int64).reshape(-1, 3)
+        indices, found = self.__drop(pack_links(links))
+        self.links[indices, 1] = numpy.asarray(new_eids, dtype=numpy.int64)[found]
+        self.__insert(pack_links(self.links[indices]), indices)
+
+
+def g_id_of(g):
+    try:
+        return g.graph_properties['id']
+    except KeyError:
+        return None
+
+
+def shared_link_index(g):
+    g_id = g_id_of(g)
+    if g_id is None or graphs.get(g_id) is not g:
+        return None
+    if g_id not in link_indexes or link_indexes[g_id].g is not g:
+        link_indexes[g_id] = LinkIndex(g)
+    index = link_indexes[g_id]
+    if index.stale:
+        index.rebuild()
+    return index
+
+
+def link_index(g):
+    index = shared_link_index(g)
+    return index if index is not None and index.fits else None
+
+
+def link_lookup(g):
+    #  Views have no shared index, so they get a throwaway one.  None when links have to be found one at a time.
+    index = link_index(g)
+    if index is None:
+        if g_id_of(g) is not None and graphs.get(g_id_of(g)) is g:
+            return None
+        index = LinkIndex(g)
+    return index.sorted_keys() if index.fits else None
+
+
+def search_links(lookup, links):
+    keys, present = lookup
+    want = pack_links(links)
+    if len(keys) == 0:
+        return numpy.full(len(want), -1, dtype=numpy.int64)
+    pos = numpy.minimum(numpy.searchsorted(keys, want), len(keys) - 1)
+    return numpy.where((keys[pos] == want) & (want >= 0), present[pos], -1)
+
+
+def edge_indices(g, links):
+    index = link_index(g)
+    if index is None:
+        return numpy.array([-1 if e is None else int(g.edge_index[e]) for e in
+                            (get_edge(g, o, t, eid) for o, eid, t in links)], dtype=numpy.int64)
+    return search_links(index.sorted_keys(), links)
+
+
+def invalidate_link_index(g_id):
+    if g_id in link_indexes:
+        link_indexes[g_id].stale = True
+
+
+def add_link_batch(g_id, pairs):
+    g = graphs[g_id]
+    pairs = numpy.asarray(pairs, dtype=numpy.int64).reshape(-1, 2)
+    keys = (pairs[:, 0] << 32) | pairs[:, 1]
+    order = numpy.argsort(keys, kind='mergesort')
+    uniq, first, counts = numpy.unique(keys[order], return_index=True, return_counts=True)
+    #  Parallel links already in the graph, counted once per distinct (origin, terminus) pair
+    existing = numpy.array([len(g.edge(int(k >> 32), int(k & 0xffffffff), all_edges=True)) for k in uniq], dtype=numpy.int64)
+    ordinals = numpy.empty(len(keys), dtype=numpy.int64)
+    ordinals[order] = numpy.repeat(existing - first, counts) + numpy.arange(len(keys))
+    links = numpy.column_stack([pairs[:, 0], ordinals, pairs[:, 1]])
+    check_link_ordinals(links)
+    with snapshot_lock:
+        contiguous = g.num_edges() == g.edge_index_range
+        add_link_array(g, links)
+        if g_id in link_indexes:
+            link_indexes[g_id].add(links, contiguous)
+        journal(g_id, 'add_links', links.tolist())
+    return links
+
+
+def place_links(g_id, batch):
+    links = add_link_batch(g_id, [(d['origin'], d['terminus']) for d in batch])
+    for d, (o, eid, t) in itertools.izip(batch, links):
+        d['id'] = '{}_{}_{}'.format(o, eid, t)
+        del d['origin']
+        del d['terminus']
+        index_uid(link_uids, g_id, d['uid'], d['id'])
+
+
+def journal(g_id, *op):
+    #  Callers hold snapshot_lock across a change and its entry, so a snapshot never sees one without the other
+    topology_versions[g_id] = topology_versions.get(g_id, 0) + 1
+    if not is_base_graph(g_id):
+        return
+    with snapshot_lock:
+        write_journal(g_id, [op])
+        log_map_op(g_id, op)
+
+
+def journal_nodes(g_id, n=1):
+    #  Node adds are counted and written as one entry, ahead of the next change or when the batch is submitted
+    topology_versions[g_id] = topology_versions.get(g_id, 0) + 1
+    if not is_base_graph(g_id):
+        return
+    with snapshot_lock:
+        pending_nodes[g_id] = pending_nodes.get(g_id, 0) + n
+        snapshot_dirty.add(g_id)
+
+
+def flush_journal(g_id):
+    with snapshot_lock:
+        if pending_nodes.get(g_id):
+            write_journal(g_id, [])
+
+
+def write_journal(g_id, ops):
+    if pending_nodes.get(g_id):
+        ops = [('add_nodes', pending_nodes.pop(g_id))] + list(ops)
+    if g_id not in journals:
+        if not os.path.isdir(snapshot_dir):
+            os.makedirs(snapshot_dir)
+        journals[g_id] = open(snapshot_paths(g_id)[2], 'a')
+    now = time.time()
+    journals[g_id].write(''.join(json.dumps([now] + list(op)) + '\n' for op in ops))
+    journals[g_id].flush()
+    snapshot_dirty.add(g_id)
+
+
+def close_journal(g_id):
+    if g_id in journals:
+        journals[g_id].close()
+        del journals[g_id]
+
+
+def save_snapshot(g_id, g=None):
+    if g is None:
+        g = graphs[g_id]
+    links_file, meta_file, journal_file = snapshot_paths(g_id)
+    with snapshot_lock:
+        if not os.path.isdir(snapshot_dir):
+            os.makedirs(snapshot_dir)
+        meta = {'num_nodes': g.num_vertices(), 'num_links': g.num_edges(), 'timestamp': time.time()}
+        with open(links_file + '.tmp', 'wb') as f:
+            numpy.save(f, link_array(g))
+        with open(meta_file + '.tmp', 'w') as f:
+            json.dump(meta, f)
+        os.rename(links_file + '.tmp', links_file)
+        os.rename(meta_file + '.tmp', meta_file)
+        close_journal(g_id)
+        if os.path.exists(journal_file):
+            os.remove(journal_file)
+        pending_nodes.pop(g_id, None)
+        snapshot_dirty.discard(g_id)
+    flush_maps(g_id)
+
+
+def drop_snapshot(g_id):
+    with snapshot_lock:
+        close_journal(g_id)
+        pending_nodes.pop(g_id, None)
+        snapshot_dirty.discard(g_id)
+        for f in snapshot_paths(g_id):
+            if os.path.exists(f):
+                os.remove(f)
+
+
+def snapshot_all():
+    for g_id in list(snapshot_dirty):
+        if is_base_graph(g_id):
+            save_snapshot(g_id)
+
+
+def replay_journal(g, journal_file, since, relabelled):
+    if not os.path.exists(journal_file):
+        return 0
+    replayed = 0
+    with open(journal_file) as f:
+        for line in f:
+            try:
+                op = json.loads(line)
+            except json.JSONDecodeError:
+                #  A torn final line from a crash, everything before it is intact.
+                break
+            if op[0] <= since:
+                continue
+            name = op[1]
+            if name == 'add_nodes':
+                g.add_vertex(n=op[2])
+            elif name == 'add_link':
+                e = g.add_edge(op[2], op[4])
+                g.edge_properties['id'][e] = op[3]
+                set_link_key(g, e)
+            elif name == 'add_links':
+                add_link_array(g, numpy.array(op[2], dtype=numpy.int64).reshape(-1, 3))
+            elif name in ['remove_link', 'relabel_link']:
+                try:
+                    e = get_edge(g, op[2], op[4], op[3])
+                except ValueError:
+                    e = None
+                if e is None:
+                    #  The journal no longer lines up with the snapshot it was written against
+                    return None
+                relabelled.discard((op[2], op[3], op[4]))
+                if name == 'remove_link':
+                    g.remove_edge(e)
+                else:
+                    g.edge_properties['id'][e] = op[5]
+                    set_link_key(g, e)
+                    relabelled.add((op[2], op[5], op[4]))
+            elif name == 'remove_node':
+                swap = g.num_vertices() - 1
+                g.remove_vertex(op[2], fast=True)
+                if op[2] != swap:
+                    for e in g.vertex(op[2]).all_edges():
+                        set_link_key(g, e)
+                moved = {swap: op[2]}
+                for o, eid, t in list(relabelled):
+                    relabelled.discard((o, eid, t))
+                    if op[2] not in [o, t]:
+                        relabelled.add((moved.get(o, o), eid, moved.get(t, t)))
+            elif name == 'clear_links':
+                g.clear_edges()
+                relabelled.clear()
+            elif name == 'clear':
+                g.clear()
+                relabelled.clear()
+            replayed += 1
+    return replayed
+
+
+def load_snapshot(g_name, c, progress):
+    links_file, meta_file, journal_file = snapshot_paths(g_name)
+    if not os.path.exists(links_file) or not os.path.exists(meta_file):
+        return None
+    print "    Loading in snapshot..."
+    with open(meta_file) as f:
+        meta = json.load(f)
+    g = blank_graph(g_name)
+    links = numpy.load(links_file, mmap_mode='r')
+    g.add_vertex(n=meta['num_nodes'])
+    add_link_array(g, links)
+    print "    %d Nodes and %d Links restored." % (g.num_vertices(), g.num_edges())
+    relabelled = set()
+    replayed = replay_journal(g, journal_file, meta['timestamp'], relabelled)
+    if replayed is None:
+        print "    Journal does not match the snapshot, falling back to a full load."
+        return None
+    print "    %d changes replayed from the journal." % replayed
+    num_nodes = auto_reql(r.db(g_name).table('nodes').count(), c)
+    num_links = auto_reql(r.db(g_name).table('links').count(), c)
+    if num_nodes != g.num_vertices() or num_links != g.num_edges() or not snapshot_matches(g, g_name, relabelled, c):
+        print "    Snapshot is out of date with the database, falling back to a full load."
+        return None
+    progress['replayed'] = replayed
+    return g
+
+
+def snapshot_matches(g, g_name, relabelled, c):
+    #  Counts alone miss links that were renumbered: every relabel the journal made, and a sample of the rest,
+    #  has to name a link that exists on both sides
+    relabelled = ['{}_{}_{}'.format(*l) for l in relabelled]
+    if len(relabelled) > 0 and auto_reql(r.db(g_name).table('links').get_all(*relabelled).count(), c) != len(relabelled):
+        return False
+    sample = auto_reql(r.db(g_name).table('links').sample(snapshot_check_size)['id'].coerce_to('array'), c)
+    for o, eid, t in parse_link_ids(sample) if len(sample) > 0 else []:
+        if o >= g.num_vertices() or t >= g.num_vertices() or get_edge(g, o, t, eid) is None:
+            return False
+    return True
+
+
+# Lazy Loading
+
+def touch_graph(g_id):
+    graph_access.pop(g_id, None)
+    graph_access[g_id] = True
+
+
+def pin_graph(g_id):
+    with pins_lock:
+        graph_pins[g_id] = graph_pins.get(g_id, 0) + 1
+
+
+def unpin_graph(g_id):
+    with pins_lock:
+        graph_pins[g_id] -= 1
+        if graph_pins[g_id] <= 0:
+            del graph_pins[g_id]
+
+
+def release_graph(g_id, result):
+    #  Streamed replies keep using the graph after q() returns, so the pin is held until the stream ends
+    if not hasattr(result, 'next'):
+        unpin_graph(g_id)
+        return result
+
+    def stream():
+        try:
+            for chunk in result:
+                yield chunk
+        finally:
+            unpin_graph(g_id)
+    return stream()
+
+
+def pinned_graphs():
+    #  A pinned view keeps its base graph resident too
+    pinned = set(graph_pins)
+    return pinned | {db_id(g_id) for g_id in pinned if g_id in graphs}
+
+
+def load_lock(g_id):
+    with load_locks_lock:
+        return load_locks.setdefault(g_id, threading.Lock())
+
+
+def ensure_graph(g_id):
+    #  Loads and evictions share the base graph's lock, so a pinned request either finds its graph resident
+    #  or waits out the eviction and loads it again
+    g = graphs.get(g_id)
+    with load_lock(g_id if g is None else g_id_of(g)):
+        if g_id in graphs:
+            return
+        if g_id not in graph_states:
+            #  A view purged along with its base graph
+            return
+        graph_states[g_id] = {'state': 'loading', 'num_nodes': 0, 'num_links': 0, 'links_loaded': 0}
+        boot_graph(g_id)
+    touch_graph(g_id)
+    evict_graphs(g_id)
+
+
+def graph_memory(g_id):
+    #  Everything an eviction frees: the topology, resident maps and arrays, the link index, and the sort orders,
+    #  commit copies and field caches kept for the graph and its views
+    g = graphs[g_id]
+    size = g.num_vertices() * vertex_bytes + g.num_edges() * edge_bytes
+    for pm in property_maps[g_id].resident.values() if g_id in property_maps else []:
+        if not hasattr(pm, 'get_array'):
+            continue
+        arr = pm.get_array()
+        if arr is not None:
+            size += arr.nbytes
+        elif pm.key_type() == 'v':
+            size += g.num_vertices() * 8
+        else:
+            size += g.num_edges() * 8
+    for arr in ndarrays[g_id].resident.values() if g_id in ndarrays else []:
+        size += arr.nbytes
+    if g_id in link_indexes:
+        index = link_indexes[g_id]
+        size += index.links.nbytes + index.sorted[0].nbytes + index.sorted[1].nbytes
+    family = {v_id for v_id, v in graphs.items() if g_id_of(v) == g_id}
+    size += sum(entry[1].nbytes for key, entry in sort_cache.items() if key[0] in family)
+    size += sum(entry[1].nbytes for key, entry in committed_maps.items() if key[0] in family)
+    for cache in field_caches.get(g_id, {}).values():
+        size += sum(col.nbytes for col in cache.columns.values())
+    return size
+
+
+def evict_graph(g_id):
+    with snapshot_lock:
+        if g_id in snapshot_dirty:
+            save_snapshot(g_id)
+        views = [v_id for v_id, v in graphs.items()
+                 if v_id != g_id and 'id' in v.graph_properties and v.graph_properties['id'] == g_id]
+        for v_id in views + [g_id]:
+            purge_graph(v_id)
+    graph_access.pop(g_id, None)
+    graph_states[g_id] = {'state': 'unloaded'}
+    print ">>>>Graph('{}') evicted from memory.".format(g_id)
+
+
+def evict_graphs(keep=None):
+    if memory_budget is None:
+        return
+    resident = [g_id for g_id in graphs if is_base_graph(g_id)]
+    usage = {g_id: graph_memory(g_id) for g_id in resident}
+    lru = [g_id for g_id in resident if g_id not in graph_access] + [g_id for g_id in graph_access if g_id in usage]
+    total = sum(usage.values())
+    for g_id in lru:
+        if total <= memory_budget:
+            break
+        if g_id == keep:
+            continue
+        #  A graph busy loading is skipped rather than waited on. Holding its load lock, a pin taken after the
+        #  check below makes that request wait in ensure_graph, so the snapshot write no longer blocks pin_graph.
+        lock = load_lock(g_id)
+        if not lock.acquire(False):
+            continue
+        try:
+            with pins_lock:
+                pinned = g_id in pinned_graphs()
+            if pinned or g_id not in graphs:
+                continue
+            evict_graph(g_id)
+        finally:
+            lock.release()
+        total -= usage[g_id]
+
+
+# Persistent Property Maps
+
+def vector_width(g, pm):
+    #  The one length every value of a vector map shares, or -1 when they differ
+    keys = g.vertices() if pm.key_type() == 'v' else g.edges()
+    lengths = set(len(pm[key]) for key in keys)
+    return lengths.pop() if len(lengths) == 1 else -1
+
+
+def map_values(g, pm, width=None):
+    arr = pm.get_array()
+    if arr is None:
+        if 'vector' not in pm.value_type():
+            return None
+        #  Only vectors of one shared length fit in a 2d array; ragged maps go row by row.
+        #  get_2d_array pads short vectors in place, so it is only called once the width is known.
+        if width is None:
+            width = vector_width(g, pm)
+        if width < 0:
+            return None
+        arr = pm.get_2d_array(range(width)).T
+    return arr
+
+
+def restore_map(g, meta, values, links=None):
+    if meta['key_type'] == 'v':
+        pm = g.new_vertex_property(meta['value_type'])
+        size = g.num_vertices()
+    else:
+        pm = g.new_edge_property(meta['value_type'])
+        size = g.edge_index_range
+    full = numpy.zeros((size,) + values.shape[1:], dtype=values.dtype)
+    if links is None:
+        n = min(size, len(values))
+        full[:n] = values[:n]
+    else:
+        idx = edge_indices(g, links)
+        found = idx >= 0
+        full[idx[found]] = values[found]
+    if full.ndim == 1:
+        pm.a[:] = full
+    else:
+        pm.set_2d_array(full.T)
+    return pm
+
+
+def replay_map_ops(values, links, ops):
+    #  Carries a map read from disk through the removals and relabels logged since it was written
+    values = numpy.array(values)
+    links = None if links is None else numpy.array(links)
+    for op in ops:
+        name = op[0]
+        if name == 'clear' or (name == 'clear_links' and links is not None):
+            values = values[:0]
+            links = None if links is None else links[:0]
+        elif name == 'remove_node':
+            node_id, last = op[1], op[2]
+            if links is None:
+                if node_id < min(last, len(values)):
+                    values[node_id] = values[last] if last < len(values) else 0
+                values = values[:last]
+            else:
+                keep = (links[:, 0] != node_id) & (links[:, 2] != node_id)
+                values, links = values[keep], links[keep]
+                for col in [0, 2]:
+                    links[links[:, col] == last, col] = node_id
+        elif links is None:
+            continue
+        elif name == 'remove_link':
+            keep = (links != op[1:4]).any(axis=1)
+            values, links = values[keep], links[keep]
+        elif name == 'relabel_link':
+            links[(links == op[1:4]).all(axis=1), 1] = op[4]
+    return values, links
+
+
+class MapStore(MutableMapping):
+    #  Removals and relabels are logged rather than applied to the files: a stored map replays the ops logged
+    #  after its own seq when it is read, and flush() folds the log into the files and moves the base past it.
+    def __init__(self, g_id, kind, parent=None):
+        self.g_id = g_id
+        self.kind = kind
+        self.resident = {}
+        self.versions = {}
+        self.widths = {}
+        self.parent = parent
+        self.hidden = set()
+        self.persist = is_base_graph(g_id)
+        self.directory = os.path.join(store_dir, g_id, kind)
+        self.base = self.__read_base()
+        self.ops = self.__read_ops()
+        self.seq = self.ops[-1][0] if len(self.ops) > 0 else self.base
+
+    def __base_file(self):
+        return os.path.join(self.directory, 'base')
+
+    def __ops_file(self):
+        return os.path.join(self.directory, 'ops')
+
+    def __read_base(self):
+        if not self.persist or not os.path.exists(self.__base_file()):
+            return 0
+        with open(self.__base_file()) as f:
+            return int(f.read().strip() or 0)
+
+    def __read_ops(self):
+        ops = []
+        if not self.persist or not os.path.exists(self.__ops_file()):
+            return ops
+        with open(self.__ops_file()) as f:
+            for line in f:
+                try:
+                    op = json.loads(line)
+                except json.JSONDecodeError:
+                    break
+                if op[0] > self.base:
+                    ops.append(op)
+        return ops
+
+    def __files(self, name):
+        base = os.path.join(self.directory, quote(name, safe=''))
+        return base + '.npy', base + '.json', base + '.links.npy'
+
+    def __current(self, name):
+        meta_file = self.__files(name)[1]
+        if not self.persist or not os.path.exists(meta_file):
+            return False
+        with open(meta_file) as f:
+            return json.load(f).get('seq', 0) >= self.base
+
+    def __stored(self):
+        if not self.persist or not os.path.isdir(self.directory):
+            return []
+        names = [unquote(f[:-5]) for f in os.listdir(self.directory) if f.endswith('.json')]
+        return [name for name in names if name in self.resident or self.__current(name)]
+
+    def __inherited(self):
+        if self.parent is None:
+            return set()
+        return set(self.parent) - self.hidden
+
+    def __write(self, name, value):
+        values_file, meta_file, links_file = self.__files(name)
+        g = graphs[self.g_id]
+        links = None
+        if self.kind == 'ndarrays':
+            values = numpy.asarray(value)
+            meta = {'key_type': 'array', 'value_type': str(values.dtype)}
+        else:
+            if not hasattr(value, 'key_type') or value.key_type() not in ['v', 'e']:
+                return False
+            try:
+                values = map_values(g, value, self.known_width(name))
+            except (ValueError, TypeError):
+                values = None
+            if 'vector' in value.value_type():
+                self.record_width(name, -1 if values is None else values.shape[1])
+            if values is None:
+                return False
+            meta = {'key_type': value.key_type(), 'value_type': value.value_type()}
+            if value.key_type() == 'e':
+                edges = g.get_edges()
+                links = link_array(g, edges)
+                values = values[edges[:, 2]]
+        meta['seq'] = self.seq
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        for f, arr in [(values_file, values), (links_file, links)]:
+            if arr is not None:
+                with open(f + '.tmp', 'wb') as out:
+                    numpy.save(out, arr)
+                os.rename(f + '.tmp', f)
+        with open(meta_file + '.tmp', 'w') as out:
+            json.dump(meta, out)
+        os.rename(meta_file + '.tmp', meta_file)
+        return True
+
+    def __remove(self, name):
+        for f in self.__files(name):
+            if os.path.exists(f):
+                os.remove(f)
+
+    def log(self, op):
+        if not self.persist or self.kind != 'property_maps' or len(self.__stored()) == 0:
+            return
+        self.seq += 1
+        self.ops.append([self.seq] + list(op))
+        with open(self.__ops_file(), 'a') as out:
+            out.write(json.dumps(self.ops[-1]) + '\n')
+
+    def flush(self):
+        #  One map in memory at a time: resident maps are already in step with the graph, the rest are replayed
+        if len(self.ops) == 0:
+            return
+        for name in self.__stored():
+            value = self.resident[name] if name in self.resident else self.__load(name)
+            if not self.__write(name, value):
+                self.__remove(name)
+        with open(self.__base_file() + '.tmp', 'w') as out:
+            out.write(str(self.seq))
+        os.rename(self.__base_file() + '.tmp', self.__base_file())
+        self.base = self.seq
+        self.ops = []
+        os.remove(self.__ops_file())
+
+    def meta(self, name):
+        if name not in self.resident and name in self.__inherited():
+            return self.parent.meta(name)
+        if name in self.resident:
+            value = self.resident[name]
+            if self.kind == 'ndarrays':
+                return {'key_type': 'array', 'value_type': str(value.dtype)}
+            return {'key_type': value.key_type(), 'value_type': value.value_type()}
+        with open(self.__files(name)[1]) as f:
+            return json.load(f)
+
+    def known_width(self, name):
+        #  A width holds until the map is replaced or the topology changes, since new nodes and links start empty
+        if name in self.widths and self.widths[name][0] == topology_versions.get(self.g_id, 0):
+            return self.widths[name][1]
+        return None
+
+    def record_width(self, name, width):
+        self.widths[name] = (topology_versions.get(self.g_id, 0), width)
+
+    def width(self, name):
+        #  Vector widths are worked out once per stored map, not on every export
+        if name not in self.resident and name in self.__inherited():
+            return self.parent.width(name)
+        pm = self[name]
+        if not hasattr(pm, 'value_type') or 'vector' not in pm.value_type():
+            return None
+        if self.known_width(name) is None:
+            self.record_width(name, vector_width(graphs[self.g_id], pm))
+        return self.known_width(name)
+
+    def array_values(self, name):
+        return block_values(graphs[self.g_id], self[name], self.width(name))
+
+    def version(self, name):
+        if name not in self.versions and name in self.__inherited():
+            return self.parent.version(name)
+        return self.versions.get(name, 0)
+
+    def __load(self, name):
+        values_file, meta_file, links_file = self.__files(name)
+        meta = self.meta(name)
+        values = numpy.load(values_file, mmap_mode='r')
+        if self.kind == 'ndarrays':
+            return values
+        links = numpy.load(links_file, mmap_mode='r') if meta['key_type'] == 'e' else None
+        ops = [op[1:] for op in self.ops if op[0] > meta.get('seq', 0)]
+        if len(ops) > 0:
+            values, links = replay_map_ops(values, links, ops)
+        if values.ndim == 2:
+            self.record_width(name, values.shape[1])
+        return restore_map(graphs[self.g_id], meta, values, links)
+
+    def __getitem__(self, name):
+        if name in self.resident:
+            return self.resident[name]
+        if name in self.__inherited():
+            return self.parent[name]
+        if not self.__current(name):
+            raise KeyError(name)
+        value = self.__load(name)
+        self.resident[name] = value
+        return value
+
+    def __setitem__(self, name, value):
+        self.resident[name] = value
+        self.versions[name] = next(map_versions)
+        self.widths.pop(name, None)
+        self.hidden.discard(name)
+        if self.persist and not self.__write(name, value):
+            self.__remove(name)
+
+    def __delitem__(self, name):
+        if name not in self:
+            raise KeyError(name)
+        self.resident.pop(name, None)
+        self.widths.pop(name, None)
+        self.versions[name] = next(map_versions)
+        if self.parent is not None:
+            self.hidden.add(name)
+        if self.persist:
+            self.__remove(name)
+
+    def __contains__(self, name):
+        return name in self.resident or self.__current(name) or name in self.__inherited()
+
+    def __iter__(self):
+        return iter(set(self.resident) | set(self.__stored()) | self.__inherited())
+
+    def __len__(self):
+        return len(set(self.resident) | set(self.__stored()) | self.__inherited())
+
+
+def log_map_op(g_id, op):
+    if op[0] not in ['remove_node', 'remove_link', 'relabel_link', 'clear_links', 'clear']:
+        return
+    if op[0] == 'remove_node':
+        #  Logged after the removal, so the node that was swapped in came from the new last position
+        op = op + (graphs[g_id].num_vertices(),)
+    prep_pm(g_id)
+    property_maps[g_id].log(op)
+
+
+def flush_maps(g_id):
+    if g_id in property_maps:
+        property_maps[g_id].flush()
+
+
+def drop_stored_maps(g_id):
+    if os.path.isdir(os.path.join(store_dir, g_id)):
+        shutil.rmtree(os.path.join(store_dir, g_id))
+
+
+# Property Map Ordering
+
+
+def sorted_order(g_id, name, kind, values, compute=True):
+    key = (g_id, name, kind)
+    stamp = (property_maps[g_id].version(name), topology_versions.get(g_id, 0), len(values))
+    if key in sort_cache and sort_cache[key][0] == stamp:
+        sort_cache[key] = sort_cache.pop(key)
+        return sort_cache[key][1]
+    if not compute:
+        return None
+    order = numpy.argsort(values, kind=kind)
+    sort_cache[key] = (stamp, order)
+    while len(sort_cache) > sort_cache_size:
+        sort_cache.popitem(last=False)
+    return order
+
+
+def forget_orders(g_id):
+    for key in [k for k in sort_cache if k[0] == g_id]:
+        del sort_cache[key]
+
+
+def edge_table(g_id, g):
+    #  Origin, link id and terminus by edge index, with -1 rows at free indices.
+    #  A base graph hands out its link index's table, so there is one copy to keep in step with the topology.
+    index = shared_link_index(g)
+    if index is not None:
+        return index.links
+    edges = g.get_edges()
+    table = numpy.full((g.edge_index_range, 3), -1, dtype=numpy.int64)
+    table[edges[:, 2]] = link_array(g, edges)
+    return table
+
+
+def select_order(values, kind=None, reverse=False, skip=0, limit=None, value_range=None, order=None):
+    need = None if limit is None else skip + limit
+    if order is not None:
+        if value_range is not None:
+            keep = numpy.ones(len(order), dtype=bool)
+            if value_range.get('min') is not None:
+                keep &= values[order] >= value_range['min']
+            if value_range.get('max') is not None:
+                keep &= values[order] <= value_range['max']
+            order = order[keep]
+        if reverse:
+            order = order[::-1]
+        return order[skip:need]
+    positions = None
+    if value_range is not None:
+        mask = numpy.ones(len(values), dtype=bool)
+        if value_range.get('min') is not None:
+            mask &= values >= value_range['min']
+        if value_range.get('max') is not None:
+            mask &= values <= value_range['max']
+        positions = numpy.flatnonzero(mask)
+        values = values[positions]
+    if kind is None:
+        order = numpy.arange(len(values)) if need is None else numpy.arange(min(need, len(values)))
+    else:
+        #  argsort puts NaN last, so they trail an ascending order and lead a reversed one
+        nans = numpy.flatnonzero(values != values)
+        rest = numpy.flatnonzero(values == values) if len(nans) > 0 else None
+        ranked = values if rest is None else values[rest]
+        wanted = need if need is None or not reverse else need - len(nans)
+        if wanted is not None and wanted <= 0:
+            order = numpy.array([], dtype=numpy.int64)
+        elif wanted is not None and wanted < len(ranked):
+            #  Find the value of the k-th winner, then only sort the rows that can beat it
+            kth = len(ranked) - wanted if reverse else wanted - 1
+            threshold = numpy.partition(ranked, kth)[kth]
+            winners = numpy.flatnonzero(ranked >= threshold if reverse else ranked <= threshold)
+            order = winners[numpy.argsort(ranked[winners], kind=kind)]
+        else:
+            order = numpy.argsort(ranked, kind=kind)
+        if rest is not None:
+            order = numpy.concatenate([rest[order], nans])
+        if reverse:
+            order = order[::-1]
+    order = order[skip:need]
+    if positions is not None:
+        order = positions[order]
+    return order
+
+
+# Bulk Loading
+
+
+def read_npy_columns(f, columns):
+    return OrderedDict((name, numpy.lib.format.read_array(f, allow_pickle=False)) for name in columns)
+
+
+def read_arrow_columns(f):
+    if pyarrow is None:
+        raise ValueError("Arrow payloads require pyarrow to be installed on the server.")
+    table = pyarrow.ipc.open_stream(f).read_all()
+    cols = OrderedDict()
+    for name in table.schema.names:
+        chunks = [chunk.to_numpy(zero_copy_only=False) for chunk in table.column(name).chunks]
+        cols[name] = numpy.concatenate(chunks) if len(chunks) > 0 else numpy.array([])
+    return cols
+
+
+def csv_column(values):
+    for dtype in [numpy.int64, numpy.float64]:
+        try:
+            return numpy.array(values, dtype=dtype)
+        except ValueError:
+            pass
+    return numpy.array(values, dtype=object)
+
+
+def read_csv_columns(f, delim=','):
+    rows = csv.reader((line.rstrip('\r') for line in tab_separate(f, delim='\n')), delimiter=str(delim))
+    names = rows.next()
+    values = zip(*rows)
+    if len(values) == 0:
+        return OrderedDict((name, numpy.array([], dtype=numpy.int64)) for name in names)
+    return OrderedDict((name, csv_column(values[i])) for i, name in enumerate(names))
+
+
+def read_columns(f, params):
+    fmt = params.get('format', 'npy')
+    if fmt == 'npy':
+        return read_npy_columns(f, params['columns'])
+    elif fmt == 'arrow':
+        return read_arrow_columns(f)
+    elif fmt == 'csv':
+        return read_csv_columns(f, params.get('delimiter', ','))
+    raise ValueError("Unknown bulk load format '{}'. Use 'npy', 'arrow' or 'csv'.".format(fmt))
+
+
+def resolve_endpoints(g_id, col, c):
+    if col.dtype.kind in 'iu':
+        return col.astype(numpy.int64)
+    ids = [find_node_uid(g_id, uid, c) for uid in col.tolist()]
+    return numpy.array([-1 if v is None else v for v in ids], dtype=numpy.int64)
+
+
 def topo_error(g_id, name, kwargs, params, gen=False):
     forbidden = ['id', 'gen_type', 'type']
     kwargs = {k: kwargs[k] for k in kwargs if k not in forbidden}
@@ -302,52 +1773,328 @@ def convert_fields(g_id, p, float_conversions, bool_conversions, int_conversions
 
 def prep_pm(g_id):
     if g_id not in property_maps:
-        property_maps[g_id] = {}
-        ndarrays[g_id] = {}
+        property_maps[g_id] = MapStore(g_id, 'property_maps')
+        ndarrays[g_id] = MapStore(g_id, 'ndarrays')
         subgraphs[g_id] = {}
     return graphs[g_id]
 
 
 def purge_graph(g_id):
     del graphs[g_id]
+    node_uids.pop(g_id, None)
+    link_uids.pop(g_id, None)
+    link_types_cache.pop(g_id, None)
+    link_indexes.pop(g_id, None)
+    topology_versions.pop(g_id, None)
+    forget_orders(g_id)
+    forget_commits(g_id)
+    field_caches.pop(g_id, None)
+    if g_id in graph_states:
+        del graph_states[g_id]
     if g_id in property_maps:
         del property_maps[g_id]
         del ndarrays[g_id]
         del subgraphs[g_id]
 
 
+# Field Caches
+
+
+class FieldCache(object):
+    #  Selected document fields as arrays, indexed by vertex index for nodes and edge index for links.
+    #  Numbers are float64 with NaN for missing, bools are int8 with -1, categories are int32 codes with -1.
+    missing = {'number': numpy.nan, 'bool': -1, 'category': -1}
+    dtypes = {'number': numpy.float64, 'bool': numpy.int8, 'category': numpy.int32}
+
+    def __init__(self, table, fields):
+        self.table = table
+        self.fields = list(fields)
+        self.columns = {}
+        self.kinds = {}
+        self.categories = {}
+        self.codes = {}
+        self.stale = True
+
+    def num_rows(self, g):
+        return g.num_vertices() if self.table == 'nodes' else g.edge_index_range
+
+    def rebuild(self, g_id, conn):
+        g = graphs[g_id]
+        self.columns = {}
+        self.kinds = {}
+        self.categories = {}
+        self.codes = {}
+        self.stale = False
+        cursor = auto_reql(r.db(db_id(g_id)).table(self.table).pluck('id', *self.fields), conn)
+        for docs in chunked(cursor):
+            self.store(g_id, docs)
+        self.grow(self.num_rows(g))
+
+    def positions(self, g_id, docs):
+        if self.table == 'nodes':
+            return numpy.array([doc['id'] for doc in docs], dtype=numpy.int64)
+        return edge_indices(graphs[g_id], parse_link_ids([doc['id'] for doc in docs]))
+
+    def grow(self, n):
+        for f, col in self.columns.items():
+            if len(col) < n:
+                grown = numpy.full(max(n, 2 * len(col)), self.missing[self.kinds[f]], dtype=col.dtype)
+                grown[:len(col)] = col
+                self.columns[f] = grown
+
+    def kind_of(self, val):
+        if isinstance(val, bool):
+            return 'bool'
+        if isinstance(val, (int, long, float)):
+            return 'number'
+        if isinstance(val, basestring):
+            return 'category'
+        return 'other'
+
+    def encode(self, f, vals):
+        kind = self.kinds[f]
+        if kind == 'number':
+            return numpy.array([v if type(v) in (int, long, float) else numpy.nan for v in vals], dtype=numpy.float64)
+        if kind == 'bool':
+            return numpy.array([-1 if not isinstance(v, bool) else int(v) for v in vals], dtype=numpy.int8)
+        codes = self.codes[f]
+        out = numpy.full(len(vals), -1, dtype=numpy.int32)
+        for i, v in enumerate(vals):
+            if isinstance(v, basestring):
+                if v not in codes:
+                    codes[v] = len(self.categories[f])
+                    self.categories[f].append(v)
+                out[i] = codes[v]
+        return out
+
+    def store(self, g_id, docs, partial=False):
+        #  partial leaves fields a document does not mention untouched, as an update would
+        if self.stale or not docs:
+            return
+        pos = self.positions(g_id, docs)
+        found = numpy.flatnonzero(pos >= 0)
+        docs = [docs[i] for i in found]
+        pos = pos[found]
+        if len(pos) == 0:
+            return
+        n = int(pos.max()) + 1
+        for f in self.fields:
+            vals = [doc.get(f) for doc in docs]
+            if f not in self.kinds:
+                kind = next((self.kind_of(v) for v in vals if v is not None), None)
+                if kind is None:
+                    continue
+                self.kinds[f] = kind
+                if kind == 'other':
+                    continue
+                self.columns[f] = numpy.full(n, self.missing[kind], dtype=self.dtypes[kind])
+                self.categories[f] = []
+                self.codes[f] = {}
+            if self.kinds[f] == 'other':
+                continue
+            self.grow(n)
+            if partial:
+                present = numpy.array([f in doc for doc in docs], dtype=bool)
+                self.columns[f][pos[present]] = self.encode(f, vals)[present]
+            else:
+                self.columns[f][pos] = self.encode(f, vals)
+
+    def clear(self, positions):
+        if self.stale:
+            return
+        positions = numpy.asarray(positions, dtype=numpy.int64)
+        for f, col in self.columns.items():
+            col[positions[positions < len(col)]] = self.missing[self.kinds[f]]
+
+    def move(self, src, dst):
+        if self.stale:
+            return
+        self.grow(max(src, dst) + 1)
+        for f, col in self.columns.items():
+            col[dst] = col[src]
+            col[src] = self.missing[self.kinds[f]]
+
+    def column(self, f, n):
+        if f not in self.kinds:
+            return numpy.full(n, numpy.nan)
+        if self.kinds[f] == 'other':
+            return None
+        self.grow(n)
+        return self.columns[f][:n]
+
+    def matches(self, f, val, n):
+        col = self.column(f, n)
+        kind = self.kinds.get(f)
+        if col is None:
+            return None
+        if kind is None or self.kind_of(val) != kind:
+            return numpy.zeros(n, dtype=bool)
+        if kind == 'bool':
+            return col == int(val)
+        if kind == 'category':
+            return col == self.codes[f].get(val, -2)
+        return col == val
+
+
+def table_cache(g_id, table):
+    #  Field caches belong to the database, so a graph and every view of it share one set of columns
+    return field_caches.get(db_id(g_id), {}).get(table)
+
+
+def field_cache(g_id, table, conn=None):
+    cache = table_cache(g_id, table)
+    if cache is not None and cache.stale:
+        cache.rebuild(db_id(g_id), conn or r.connect())
+    return cache
+
+
+def cache_docs(g_id, table, docs, partial=False):
+    cache = table_cache(g_id, table)
+    if cache is not None:
+        cache.store(db_id(g_id), docs, partial)
+
+
+def cache_clear(g_id, table, positions):
+    cache = table_cache(g_id, table)
+    if cache is not None:
+        cache.clear(positions)
+
+
+def cache_move(g_id, table, src, dst):
+    cache = table_cache(g_id, table)
+    if cache is not None:
+        cache.move(src, dst)
+
+
+def stale_fields(g_id, table=None):
+    for t, cache in field_caches.get(db_id(g_id), {}).items():
+        if table is None or t == table:
+            cache.stale = True
+
+
+def cached_values(g_id, table, func, conn):
+    #  A field name maps straight to its column, and a dict of field values is a vectorized equality filter
+    cache = table_cache(g_id, table)
+    if cache is None:
+        return None
+    if isinstance(func, basestring):
+        if func not in cache.fields:
+            return None
+        cache = field_cache(g_id, table, conn)
+        col = cache.column(func, cache.num_rows(graphs[db_id(g_id)]))
+        if col is None or cache.kinds.get(func) == 'category':
+            return None
+        if cache.kinds.get(func) == 'bool':
+            return col == 1
+        return col
+    if isinstance(func, dict):
+        if not func or any(f not in cache.fields or isinstance(v, (dict, list)) for f, v in func.iteritems()):
+            return None
+        cache = field_cache(g_id, table, conn)
+        n = cache.num_rows(graphs[db_id(g_id)])
+        mask = numpy.ones(n, dtype=bool)
+        for f, v in func.iteritems():
+            matched = cache.matches(f, v, n)
+            if matched is None:
+                return None
+            mask &= matched
+        return mask
+    return None
+
+
+def fill_from_cache(pm, values):
+    arr = pm.get_array()
+    if arr is None:
+        return False
+    k = min(len(arr), len(values))
+    if arr.dtype.kind in 'iub' and values.dtype.kind == 'f':
+        values = numpy.where(numpy.isnan(values), 0, values)
+    arr[:k] = values[:k]
+    return True
+
+
 acceptable_types = ['nodes', 'links', 'node_types', 'link_types']
 
 valid_stream_coerces = ['stream', 'array']
 
 
 def node_property_map(g_id, prop_map_name, prop_map_type, func, conn):
+    property_maps[g_id][prop_map_name] = build_node_map(g_id, prop_map_type, func, conn)
+    return {'property_map': prop_map_name}
+
+
+def link_property_map(g_id, prop_map_name, prop_map_type, func, conn):
+    property_maps[g_id][prop_map_name] = build_link_map(g_id, prop_map_type, func, conn)
+    return {'property_map': prop_map_name}
+
+
+def build_node_map(g_id, prop_map_type, func, conn):
     g = prep_pm(g_id)
     pm = g.new_vertex_property(prop_map_type)
-    if type(func).__name__ in ['str', 'unicode']:
+    values = cached_values(g_id, 'nodes', func, conn)
+    if values is not None and fill_from_cache(pm, values):
+        return pm
+    if type(func).__name__ in ['str', 'unicode'] and field_name_check.match(func):
+        def final_func(node):
+            return [node['id'], node[func]]
+    elif type(func).__name__ in ['str', 'unicode']:
         final_func = r.js("(function(node){return [node['id'], %s(node)]})" % func)
     else:
         def final_func(node):
             return node['id'], func(node)
-    for node_id, node_val in auto_reql(r.db(db_id(g_id)).table('nodes').map(final_func), conn):
-        pm[node_id] = node_val
-    property_maps[g_id][prop_map_name] = pm
-    return {'property_map': prop_map_name}
+    arr = pm.get_array()
 
+    def fill(cursor):
+        for rows in chunked(cursor):
+            if arr is not None:
+                try:
+                    arr[numpy.array([row[0] for row in rows], dtype=numpy.int64)] = \
+                        numpy.asarray([row[1] for row in rows], dtype=arr.dtype)
+                    continue
+                except (ValueError, TypeError):
+                    pass
+            for node_id, node_val in rows:
+                pm[node_id] = node_val
 
-def link_property_map(g_id, prop_map_name, prop_map_type, func, conn):
+    parallel_scan(g_id, 'nodes', lambda qu: qu.map(final_func), fill)
+    return pm
+
+
+def build_link_map(g_id, prop_map_type, func, conn):
     g = prep_pm(g_id)
     pm = g.new_edge_property(prop_map_type)
-    if type(func).__name__ in ['str', 'unicode']:
-        final_func = r.js("(function(link){return [link['id'].split('_'), %s(link)]})" % func)
+    values = cached_values(g_id, 'links', func, conn)
+    if values is not None and fill_from_cache(pm, values):
+        return pm
+    if type(func).__name__ in ['str', 'unicode'] and field_name_check.match(func):
+        def final_func(link):
+            return [link['id'], link[func]]
+    elif type(func).__name__ in ['str', 'unicode']:
+        final_func = r.js("(function(link){return [link['id'], %s(link)]})" % func)
     else:
         def final_func(link):
-            return link['id'].split('_'), func(link)
-    for [o, eid, t], link_val in auto_reql(r.db(db_id(g_id)).table('links').map(final_func), conn):
-        e = get_edge(g, o, t, eid)
-        pm[e] = link_val
-    property_maps[g_id][prop_map_name] = pm
-    return {'property_map': prop_map_name}
+            return link['id'], func(link)
+    arr = pm.get_array()
+    #  Resolved once here, since the scan workers fill chunks concurrently
+    lookup = link_lookup(g)
+
+    def fill(cursor):
+        for rows in chunked(cursor):
+            links = parse_link_ids([row[0] for row in rows])
+            idx = edge_indices(g, links) if lookup is None else search_links(lookup, links)
+            found = numpy.flatnonzero(idx >= 0)
+            if arr is not None:
+                try:
+                    arr[idx[found]] = numpy.asarray([rows[i][1] for i in found], dtype=arr.dtype)
+                    continue
+                except (ValueError, TypeError):
+                    pass
+            for i in found:
+                o, eid, t = links[i]
+                pm[get_edge(g, int(o), int(t), int(eid))] = rows[i][1]
+
+    parallel_scan(g_id, 'links', lambda qu: qu.map(final_func), fill)
+    return pm
 
 
 def invalid_float_replacer(val):
@@ -364,6 +2111,41 @@ def invalid_float_replacer(val):
         return val
 
 
+def commit_values(values):
+    #  One tolist() for the chunk, then only the entries invalid_float_replacer would rewrite are patched
+    out = values.tolist()
+    if values.dtype.kind == 'f':
+        bad = ~numpy.isfinite(values)
+    elif values.dtype.kind in 'iu':
+        bad = values == 2147483647
+    else:
+        return out
+    for pos in zip(*numpy.nonzero(bad)):
+        row = out
+        for i in pos[:-1]:
+            row = row[i]
+        row[pos[-1]] = invalid_float_replacer(row[pos[-1]])
+    return out
+
+
+def changed_rows(old, new):
+    #  Rows whose value differs from the last commit, where NaN counts as equal to NaN
+    changed = old != new
+    if new.dtype.kind == 'f':
+        changed &= ~(numpy.isnan(old) & numpy.isnan(new))
+    if changed.ndim > 1:
+        changed = changed.any(axis=1)
+    return changed
+
+
+def forget_commits(g_id, table=None):
+    #  A write to a table reaches every view of its database, so their copies go with the graph's own
+    dbid = db_id(g_id) if g_id in graphs else g_id
+    for key in committed_maps.keys():
+        if (key[0] == g_id or (key[0] in graphs and db_id(key[0]) == dbid)) and table in [None, key[1]]:
+            committed_maps.pop(key, None)
+
+
 # REST API LAYER
 
 def p_b_ot():
@@ -401,27 +2183,51 @@ class API(object):
             head = cherrypy.request.headers
             q = head['q']
             if q == "ping":
+                cherrypy.response.headers['Wire-Formats'] = ', '.join(wire_formats)
                 return "Hi there!"
             elif q == "list_graphs":
-                return json.dumps([g_id for g_id in graphs])
+                if 'params' in head and json.loads(head['params']).get('states'):
+                    states = {g_id: {'state': 'ready'} for g_id in graphs}
+                    states.update(graph_states)
+                    return json.dumps(states)
+                return json.dumps(list(set(graphs) | set(graph_states)))
             if 'g' not in head:
                 return json.dumps({'error': errors['MissingFields']['id']['graph']()})
             else:
                 g_id = head['g']
-            if q not in ["create_graph", "generate"]:
-                if g_id not in graphs:
-                    return json.dumps({'error': errors['Nonexistence']['graph'](g_id)})
-                dbid = db_id(g_id)
-            else:
-                dbid = None
-            conn = r.connect()
-            if q in self.queries:
-                return self.queries[q](self, g_id, dbid, head, conn)
+            pin_graph(g_id)
+            try:
+                result = self.route(q, g_id, head)
+            except BaseException:
+                unpin_graph(g_id)
+                raise
+            return release_graph(g_id, result)
         else:
             wrong_key()
     q.exposed = True
     q._cp_config = {'response.stream': True}
 
+    def route(self, q, g_id, head):
+        if q not in ["create_graph", "generate"]:
+            if lazy_mode and (g_id in graphs or g_id in graph_states):
+                ensure_graph(g_id)
+            if g_id not in graphs:
+                if g_id in graph_states:
+                    if q == "graph_stats":
+                        return json.dumps(dict(graph_states[g_id], id=g_id))
+                    cherrypy.response.status = 503
+                    return json.dumps({'error': errors['Unavailable']['graph'](g_id, graph_states[g_id])})
+                return json.dumps({'error': errors['Nonexistence']['graph'](g_id)})
+            dbid = db_id(g_id)
+            touch_graph(dbid)
+            if lazy_mode:
+                evict_graphs(dbid)
+        else:
+            dbid = None
+        conn = r.connect()
+        if q in self.queries:
+            return self.queries[q](self, g_id, dbid, head, conn)
+
     def update(self):
         if not secure or check_key():
             with open(os.path.join(path, 'preql_queries.pickle')) as pq:
@@ -465,6 +2271,11 @@ if __name__ == "__main__":
         free_mode = True
     else:
         free_mode = False
+    lazy_mode = "--lazy" in sys.argv
+    memory_budget = None
+    for arg in sys.argv:
+        if arg.startswith("--memory-budget="):
+            memory_budget = int(arg.split('=', 1)[1]) * 1024 * 1024
     with open(os.path.join(path, "synthdb_internal.pickle")) as sdb:
         funcs = pickle.load(sdb)
         node_topo_funcs = funcs['node_topo_funcs']
@@ -477,12 +2288,19 @@ if __name__ == "__main__":
         topo_formats = funcs['topo_formats']
 
     dbs = auto_reql(r.db_list(), r_conn)
+    boot_pool = ThreadPoolExecutor(max_workers=boot_workers)
     for n in dbs:
         if n != "test" and n != "rethinkdb":
-            temp_g = load_graph(n, r_conn)
-            graphs[n] = temp_g
+            if lazy_mode:
+                graph_states[n] = {'state': 'unloaded'}
+                continue
+            graph_states[n] = {'state': 'loading', 'num_nodes': 0, 'num_links': 0, 'links_loaded': 0}
+            boot_pool.submit(boot_graph, n)
+    boot_pool.shutdown(wait=False)
 
     cherrypy.tree.mount(API(), '/preql')
     cherrypy.engine.timeout_monitor.unsubscribe()
+    Monitor(cherrypy.engine, snapshot_all, frequency=snapshot_interval, name='Snapshots').subscribe()
+    cherrypy.engine.subscribe('stop', snapshot_all)
     cherrypy.engine.start()
     cherrypy.engine.block()
\ No newline at end of file
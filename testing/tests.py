@@ -3,6 +3,9 @@ from random import randint
 from datetime import datetime
 import preqlerrors
 from sys import stdout
+from subprocess import call
+from time import sleep
+import numpy
 
 dt = datetime.now()
 c = synthdb.connect('https://localhost', key_file="/home/ubuntu/synthdb/secure.key")
@@ -11,6 +14,9 @@ nn = 100
 d = 2
 max_iter = 1000
 
+#  Shell command that restarts the server, so snapshot recovery can be checked. None skips that check.
+restart_cmd = None
+
 
 def basic_test(r):
     return type(r).__name__ in ["dict", 'float', 'int', 'list', 'bool']
@@ -424,6 +430,34 @@ def try_it(qu):
     return passed, 1, req
 
 
+def check_it(qu, test):
+    stdout.write("\r{} ---> ".format(qu))
+    stdout.flush()
+    passed = 0
+    req = None
+    try:
+        req = qu.run(c)
+        if test(req):
+            passed = 1
+            stdout.write("PASS\n")
+        else:
+            fails.append(err_format(qu, req))
+            stdout.write("FAIL\n")
+            print err_format(qu, req)
+    except (preqlerrors.TopologyError, preqlerrors.ValueTypeError, preqlerrors.NonexistenceError) as e:
+        errors.append(err_format(qu, str(e.msg)))
+        stdout.write("ERROR\n")
+    stdout.flush()
+    return passed, 1, req
+
+
+def same_values(a, b):
+    #  Array replies may spell NaN as a string
+    a = [float('nan') if v in [None, "NaN"] else v for v in a]
+    b = [float('nan') if v in [None, "NaN"] else v for v in b]
+    return len(a) == len(b) and all(x == y or (x != x and y != y) for x, y in zip(a, b))
+
+
 for k in generator_funcs:
     g_name = k[:4]+"_default"
     params = generator_funcs[k]['required']
@@ -800,6 +834,179 @@ for g in synthdb.list_graphs().run(c):
     total_queries += tq
 
 
+g = "feat_test"
+scores = numpy.arange(nn, dtype=numpy.float64)
+chain = numpy.arange(nn - 10)
+checks = [
+    (synthdb.create_graph(g), basic_test),
+    (synthdb.graph(g).insert_nodes([{'score': i} for i in range(nn)]), lambda r: r['inserted'] == nn),
+    (synthdb.graph(g).links().bulk_load({'origin': chain, 'terminus': chain + 1, 'weight': chain * 0.5}),
+     lambda r: r['inserted'] == nn - 10 and r['failures'] == []),
+    (synthdb.graph(g).links().bulk_load({'origin': numpy.array([0]), 'terminus': numpy.array([nn * 10])}),
+     lambda r: r['inserted'] == 0 and len(r['failures']) == 1),
+    (synthdb.graph(g).links().count(), lambda r: r == nn - 10),
+    #  Link ids come back from packed keys on the topology paths
+    (synthdb.graph(g).shortest_path(origin=0, terminus=5),
+     lambda r: r['nodes'] == range(6) and r['links'] == ['{}_0_{}'.format(i, i + 1) for i in range(5)]),
+    (synthdb.graph(g).link('{}_0_{}'.format(nn - 12, nn - 11)), lambda r: r['id'] == '{}_0_{}'.format(nn - 12, nn - 11)),
+    (synthdb.graph(g).nodes().cache_fields('score', 'score_copy'), lambda r: r['cached_fields'] == ['score', 'score_copy']),
+    (synthdb.graph(g).links().cache_fields('weight'), lambda r: r['cached_fields'] == ['weight']),
+    (synthdb.graph(g).nodes().map('score').coerce_to('property_map', name='score', type='double'), basic_test),
+    (synthdb.graph(g).links().map('weight').coerce_to('property_map', name='weight', type='double'), basic_test),
+    (synthdb.graph(g).property_map('score').coerce_to('binary'), lambda r: numpy.array_equal(r, scores)),
+    (synthdb.graph(g).property_map('weight').coerce_to('binary'), lambda r: numpy.array_equal(numpy.sort(r), chain * 0.5)),
+    (synthdb.graph(g).random_layout(pos='feat_pos'), basic_test),
+    (synthdb.graph(g).property_map('feat_pos').coerce_to('binary'), lambda r: r.shape == (nn, 2)),
+    (synthdb.graph(g).property_map('feat_pos').coerce_to('array'), lambda r: len(r) == nn and len(r[0][1]) == 2),
+    (synthdb.graph(g).property_map('score').value_range(min=nn + 1).coerce_to('binary'),
+     lambda r: len(r) == 0 and r.dtype == numpy.float64),
+    (synthdb.graph(g).property_map('score').value_range(min=nn + 1).coerce_to('binary', ids=True),
+     lambda r: len(r[0]) == 0 and len(r[1]) == 0),
+    (synthdb.graph(g).property_map('score').sort().skip(5).limit(10).coerce_to('array'),
+     lambda r: [row[0] for row in r] == range(5, 15)),
+    (synthdb.graph(g).property_map('score').sort(reverse=True).skip(5).limit(10).coerce_to('array'),
+     lambda r: [row[0] for row in r] == range(nn - 6, nn - 16, -1)),
+    (synthdb.graph(g).property_map('score').value_range(min=10, max=19).sort().coerce_to('array'),
+     lambda r: [row[0] for row in r] == range(10, 20)),
+    (synthdb.graph(g).property_map('score').commit('score_copy', incremental=True), lambda r: r['replaced'] == nn),
+    (synthdb.graph(g).property_map('score').commit('score_copy', incremental=True),
+     lambda r: r['replaced'] == 0 and r['unchanged'] == 0),
+    #  A write to the table drops the copy, so the next incremental commit puts the field back
+    (synthdb.graph(g).node(3).update({'score_copy': -1}), basic_test),
+    (synthdb.graph(g).property_map('score').commit('score_copy', incremental=True), lambda r: r['replaced'] == 1),
+    (synthdb.graph(g).nodes().map('score_copy').coerce_to('property_map', name='score_copy', type='double'), basic_test),
+    (synthdb.graph(g).property_map('score_copy').coerce_to('binary'), lambda r: numpy.array_equal(r, scores)),
+    #  Without a cache a bare field name is read straight from the documents
+    (synthdb.graph(g).nodes().cache_fields('score_copy', drop=True), lambda r: r['cached_fields'] == ['score']),
+    (synthdb.graph(g).nodes().map('score_copy').coerce_to('property_map', name='score_scan', type='double'), basic_test),
+    (synthdb.graph(g).property_map('score_scan').coerce_to('binary'), lambda r: numpy.array_equal(r, scores)),
+    (synthdb.graph(g).closeness(nprop='nan_closeness'), basic_test),
+]
+for qu, test in checks:
+    pa, tq, req = check_it(qu, test)
+    passes += pa
+    total_queries += tq
+
+#  Removing a link renumbers the rest of its pair, and every later lookup has to follow the new ordinals
+parallel = ['0_{}_1'.format(i) for i in range(11)]
+checks = [
+    (synthdb.graph(g).insert_links([{'origin': 0, 'terminus': 1, 'value': i * 10 - 5} for i in range(12)]),
+     lambda r: r['inserted'] == 12),
+    #  Elastic link types widen to every value in the batch, whichever insert worker saw it
+    (synthdb.graph(g).link_type('Link'), lambda r: r['min'] == -5 and r['max'] == 105),
+    (synthdb.graph(g).link('0_5_1').delete(), lambda r: r['links_deleted'] == 1),
+    (synthdb.graph(g).links(parallel).coerce_to('array'), lambda r: sorted(l['id'] for l in r) == sorted(parallel)),
+    (synthdb.graph(g).node(0).out_links(), lambda r: set(parallel) <= {l['id'] for l in r}),
+    (synthdb.graph(g).links().map('weight').coerce_to('property_map', name='weight', type='double'), basic_test),
+    (synthdb.graph(g).property_map('weight').get_all(parallel).coerce_to('array'),
+     lambda r: sorted(row[0] for row in r) == sorted(parallel)),
+    #  Whole-map link streams read ids from the link index, which has to have followed the renumbering
+    (synthdb.graph(g).property_map('weight').coerce_to('array'),
+     lambda r: len(r) == nn - 10 + 11 and set(parallel) <= {row[0] for row in r}),
+]
+checks += [(synthdb.graph(g).link(l), lambda r: r['id'] in parallel) for l in parallel]
+for qu, test in checks:
+    pa, tq, req = check_it(qu, test)
+    passes += pa
+    total_queries += tq
+
+#  Top-k over a map with NaN must agree with a full sort of the same values, NaN last ascending and first reversed
+closeness = synthdb.graph(g).property_map('nan_closeness').coerce_to('binary').run(c)
+print "{} NaN closeness values".format(numpy.isnan(closeness).sum())
+ranked = numpy.sort(closeness).tolist()
+for reverse in [False, True]:
+    expected = (ranked[::-1] if reverse else ranked)[2:12]
+    qu = synthdb.graph(g).property_map('nan_closeness').sort(reverse=reverse).skip(2).limit(10).coerce_to('array')
+    pa, tq, req = check_it(qu, lambda r: same_values([row[1] for row in r], expected))
+    passes += pa
+    total_queries += tq
+
+if restart_cmd is not None:
+    call(restart_cmd, shell=True)
+    while True:
+        try:
+            states = synthdb.list_graphs(states=True).run(c)
+            if states.get(g, {}).get('state') in ['ready', 'unloaded']:
+                break
+        except Exception:
+            pass
+        sleep(1)
+    checks = [
+        (synthdb.graph(g).nodes().count(), lambda r: r == nn),
+        (synthdb.graph(g).links().count(), lambda r: r == nn - 10 + 11),
+        #  Relabels replayed from the journal have to land on the same ids the database holds
+        (synthdb.graph(g).links(parallel).coerce_to('array'), lambda r: sorted(l['id'] for l in r) == sorted(parallel)),
+        (synthdb.graph(g).link('0_10_1'), lambda r: r['id'] == '0_10_1'),
+        (synthdb.graph(g).property_map('score').coerce_to('binary'), lambda r: numpy.array_equal(r, scores)),
+        #  Stored maps come back through the removal log rather than a rewrite on every delete
+        (synthdb.graph(g).property_map('feat_pos').coerce_to('binary'), lambda r: r.shape == (nn, 2)),
+        (synthdb.graph(g).property_map('weight').get_all(parallel).coerce_to('array'),
+         lambda r: sorted(row[0] for row in r) == sorted(parallel)),
+        (synthdb.graph(g).node(nn - 1).out_degree(), basic_test),
+        #  The first request after a restart loads a lazy graph under its pin, and it stays resident for the next
+        (synthdb.list_graphs(states=True), lambda r: r[g]['state'] == 'ready'),
+    ]
+    for qu, test in checks:
+        pa, tq, req = check_it(qu, test)
+        passes += pa
+        total_queries += tq
+
+synthdb.drop_graph(g).run(c)
+
+#  uid lookups have to follow a link through its pair's renumbering and a node through remove_node's swap
+g = "uid_test"
+checks = [
+    (synthdb.create_graph(g), basic_test),
+    (synthdb.graph(g).insert_nodes([{'uid': 'n{}'.format(i)} for i in range(5)]), lambda r: r['inserted'] == 5),
+    (synthdb.graph(g).insert_links([{'origin': 'n0', 'terminus': 'n2', 'uid': 'l{}'.format(i)} for i in range(3)]),
+     lambda r: r['inserted'] == 3),
+    (synthdb.graph(g).link('l0').delete(), lambda r: r['links_deleted'] == 1),
+    (synthdb.graph(g).link('l2'), lambda r: r['id'] == '0_1_2'),
+    (synthdb.graph(g).node('n1').delete(), lambda r: r['nodes_deleted'] == 1),
+    (synthdb.graph(g).node('n4'), lambda r: r['id'] == 1),
+    (synthdb.graph(g).insert_links({'origin': 'n4', 'terminus': 'n0', 'uid': 'l3'}), lambda r: r['inserted'] == 1),
+    (synthdb.graph(g).link('l3'), lambda r: r['id'] == '1_0_0'),
+    (synthdb.graph(g).nodes(['n4', 'n2'], index='uid').coerce_to('array'),
+     lambda r: sorted(n['id'] for n in r) == [1, 2]),
+]
+#  Pipelined inserts with small, adaptive batches still land every document exactly once
+checks += [
+    (synthdb.graph(g).insert_nodes([{'uid': 'p{}'.format(i)} for i in range(50)], batch_size=7, pipeline_depth=3,
+                                   adaptive=True), lambda r: r['inserted'] == 50 and r['errors'] == 0),
+    (synthdb.graph(g).nodes().count(), lambda r: r == 54),
+    (synthdb.graph(g).node('p49'), lambda r: r['id'] == 53),
+]
+for qu, test in checks:
+    pa, tq, req = check_it(qu, test)
+    passes += pa
+    total_queries += tq
+
+#  Both wire formats have to carry the same inserts and streams
+if c.wire_format == 'msgpack':
+    cj = synthdb.Connection(c.host, c.key, c.verify, 'json')
+    for conn in [c, cj]:
+        for qu, test in [
+            (synthdb.graph(g).insert_nodes([{'uid': 'w{}\t{}'.format(conn.wire_format, i), 'note': u'tab\there \u00e9'}
+                                            for i in range(5)]), lambda r: r['inserted'] == 5),
+            (synthdb.graph(g).nodes().filter({'note': u'tab\there \u00e9'}).coerce_to('array'),
+             lambda r: len(r) == (5 if conn is c else 10)),
+        ]:
+            stdout.write("\r[{}] {} ---> ".format(conn.wire_format, qu))
+            total_queries += 1
+            try:
+                req = qu.run(conn)
+                if test(req):
+                    passes += 1
+                    stdout.write("PASS\n")
+                else:
+                    fails.append(err_format(qu, req))
+                    stdout.write("FAIL\n")
+            except (preqlerrors.TopologyError, preqlerrors.ValueTypeError, preqlerrors.NonexistenceError) as e:
+                errors.append(err_format(qu, str(e.msg)))
+                stdout.write("ERROR\n")
+
+synthdb.drop_graph(g).run(c)
+
 for f in fails:
     print "FAIL: {}".format(f)
 